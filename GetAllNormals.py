@@ -1,5 +1,21 @@
+""" Export the face normals of the active mesh object.
+
+        blender -b socket.blend --python GetAllNormals.py -- normals.npy --buckets normal_buckets.npz
+
+    The normals are written as an (F x 3) float32 .npy file, which np.load can
+    memory-map (mmap_mode='r'). With --buckets, the indices of the faces facing
+    x < 0, y < 0 and y > 0 are saved as 'xminus', 'yminus' and 'yplus'.
+"""
+
+import argparse
+import sys
+import time
+
 import bpy
-import bmesh
+import numpy as np
+
+
+CHUNK = 1 << 20 # faces per chunk when sorting the normals into buckets
 
 
 def rotFaces(rotval, arrsel, bme):
@@ -16,47 +32,78 @@ def rotFaces(rotval, arrsel, bme):
         f.select = False
 
 
-ob = bpy.context.active_object
-me = ob.data
-bm = bmesh.new()
-bm.from_mesh(me)
-bm.normal_update()
-print('selected bmesh:', bm)
-
-bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-bpy.ops.mesh.select_all(action='DESELECT')
-bpy.context.scene.tool_settings.mesh_select_mode = (False, False, True)
-bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-
-for f in bm.faces:
-    print('face index:', f.index, ' and face normal:', f.normal)
-
-#xminus = []
-#yminus = []
-#yplus = []
-
-#for f in bm.faces:
-#    if f.normal[0] < 0:
-#        xminus.append(f)
-
-#for f in bm.faces:
-#    if f.normal[1] < 0:
-#        yminus.append(f)
-
-#for f in bm.faces:
-#    if f.normal[1] > 0:
-#        yplus.append(f)
-
-#print('xminus: ', xminus)
-#print('yminus: ', yminus)
-#print('yplus: ', yplus)
-
-#rotv = 3.141529
-#rotFaces(rotv, xminus, bm)
-#bm.to_mesh(me)
-#rotv = 3.141529 / 2
-#rotFaces(rotv, yminus, bm)
-#bm.to_mesh(me)
-#rotv = -3.141529 / 2
-#rotFaces(rotv, yplus, bm)
-#bm.to_mesh(me)
\ No newline at end of file
+def export_normals(obj, path):
+    """ Write the face normals of a mesh object to a .npy file.
+
+        foreach_get fills the memory-mapped file directly, no copy of the normals
+        is kept in memory.
+
+        Input:  mesh object, .npy file name
+        Output: float array (F x 3), memory-mapped
+    """
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+    polygons = obj.data.polygons
+
+    if not len(polygons):
+        np.save(path, np.empty((0, 3), dtype=np.float32))
+        return np.load(path)
+
+    normals = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(polygons), 3))
+    polygons.foreach_get('normal', normals.reshape(-1))
+    normals.flush()
+    return normals
+
+
+def normal_buckets(normals, chunk=CHUNK):
+    """ Sort the faces by the direction of their normals, chunk by chunk.
+
+        Input:  float array (F x 3), faces per chunk
+        Output: dict{'xminus': x < 0, 'yminus': y < 0, 'yplus': y > 0 face indices}
+    """
+    tests = {'xminus': lambda block: block[:, 0] < 0,
+             'yminus': lambda block: block[:, 1] < 0,
+             'yplus': lambda block: block[:, 1] > 0}
+    parts = {name: [np.empty(0, dtype=np.int64)] for name in tests}
+    for start in range(0, len(normals), chunk):
+        block = np.asarray(normals[start:start + chunk])
+        for name, test in tests.items():
+            parts[name].append(np.nonzero(test(block))[0] + start)
+    return {name: np.concatenate(indices) for name, indices in parts.items()}
+
+
+def deselect_all(mesh):
+    """ Deselect all vertices, edges and faces of a mesh in object mode. """
+    mesh.vertices.foreach_set('select', np.zeros(len(mesh.vertices), dtype=bool))
+    mesh.edges.foreach_set('select', np.zeros(len(mesh.edges), dtype=bool))
+    mesh.polygons.foreach_set('select', np.zeros(len(mesh.polygons), dtype=bool))
+    mesh.update()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='GetAllNormals.py', description=__doc__.splitlines()[0])
+    parser.add_argument('output', nargs='?', default='normals.npy', help=".npy file for the face normals")
+    parser.add_argument('--buckets', help=".npz file for the x < 0, y < 0 and y > 0 face indices")
+    parser.add_argument('--chunk', type=int, default=CHUNK)
+    args = parser.parse_args(argv)
+
+    ob = bpy.context.active_object
+    if ob.mode == 'EDIT':
+        bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+    deselect_all(ob.data)
+    bpy.context.scene.tool_settings.mesh_select_mode = (False, False, True)
+
+    start = time.perf_counter()
+    normals = export_normals(ob, args.output)
+    print('{} face normals written to {} in {:.2f} sec'.format(len(normals), args.output, time.perf_counter() - start))
+
+    if args.buckets:
+        start = time.perf_counter()
+        buckets = normal_buckets(normals, args.chunk)
+        np.savez(args.buckets, **buckets)
+        print('Buckets {} written to {} in {:.2f} sec'.format({name: len(indices) for name, indices in buckets.items()},
+                                                              args.buckets, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else [])
@@ -1,14 +1,24 @@
 import bpy
-import bgl # opengl binder
 import bmesh
-import math
 import mathutils
-import json
-import time
-from mathutils import Vector, Matrix
-import pdb as DBG
-
-from bpy_extras.object_utils import world_to_camera_view
+import mathutils.bvhtree
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from mathutils import Vector
+import numpy as np
+
+# the shapetool package lives next to this script and the .blend file
+script_dirs = [os.path.dirname(bpy.data.filepath)]
+if '__file__' in globals():
+    script_dirs.append(os.path.dirname(os.path.abspath(__file__)))
+for script_dir in script_dirs:
+    if script_dir and script_dir not in sys.path:
+        sys.path.append(script_dir)
+
+from shapetool import angular, core, loops, trace
+from shapetool.log import Logger
 
 
 # exec(compile(open('/home/ilian/git-projects/blender-shapetool/MatrixApproach.py').read(), '/home/ilian/git-projects/blender-shapetool/MatrixApproach.py', 'exec'))
@@ -57,20 +67,6 @@ class ShapeToolAsserts():
         return ShapeToolAsserts.ERR_CODES.OK
 
 
-class Logger:
-    LOGGER_ENABLED = True
-    f = open('logfile.txt', 'w')
-    print("Open logger")
-    def __del__(self):
-        print("Closing logger")
-        f.flush()
-        f.close()
-
-    @staticmethod
-    def log(msg):
-        Logger.f.write(str(msg)+"\n")
-        Logger.f.flush()
-
 # GL stuff
 
 class GLUtils(object):
@@ -80,39 +76,40 @@ class GLUtils(object):
 
     @staticmethod
     def getViewport():
+        import bgl # opengl binder, only available with a GL context
         view = bgl.Buffer(bgl.GL_INT, 4)
         bgl.glGetIntegerv(bgl.GL_VIEWPORT, view)
         return view
 
     @staticmethod
     def getProjectionMTX():
+        import bgl # opengl binder, only available with a GL context
         proj_mtx = bgl.Buffer(bgl.GL_DOUBLE, [4,4])
         bgl.glGetDoublev(bgl.GL_PROJECTION_MATRIX, proj_mtx)
         return  proj_mtx
 
     @staticmethod
     def getModelViewMTX():
+        import bgl # opengl binder, only available with a GL context
         mv_mtx = bgl.Buffer(bgl.GL_DOUBLE, [4, 4])
         bgl.glGetDoublev(bgl.GL_MODELVIEW_MATRIX, mv_mtx)
         return  mv_mtx
 
 
     @staticmethod
-    def mouseCoordsTo3DView(mx, my):
-        depth = bgl.Buffer(bgl.GL_FLOAT, [0.0])
-        bgl.glReadPixels(mx, my, 1, 1, bgl.GL_DEPTH_COMPONENT, bgl.GL_FLOAT, depth)
-        # if (depth[0] != 1.0):
-        world_x = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-        world_y = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-        world_z = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-        view1 = GLUtils.getViewport()
-        model = GLUtils.getModelViewMTX()
-        proj = GLUtils.getModelViewMTX()
-        bgl.gluUnProject(mx, my, depth[0],
-                         model, proj,
-                         view1,
-                         world_x, world_y, world_z)
-        return world_x[0], world_y[0], world_z[0]
+    def mouseCoordsTo3DView(mx, my, context=None):
+        """ World coordinates under the window coordinates, see MouseTo3D.ViewUnprojector.
+            The view matrices are re-read when the view of the context (bpy.context
+            by default) changed, the buffers are reused between calls.
+        """
+        return GLUtils.mouseCoordsTo3DViewBatch([(mx, my)], context)[0]
+
+    @staticmethod
+    def mouseCoordsTo3DViewBatch(coords, context=None):
+        """ World coordinates under a list of window (x, y) coordinates. """
+        from MouseTo3D import unprojector
+        unprojector().update(context or bpy.context)
+        return unprojector().unproject(coords)
 
 
 
@@ -217,27 +214,131 @@ def mesh_objects():
     return objects
 
 
-def save_vertex_groups(mesh):
-    """ Saves the coordinates of all zone arrow and aligning vertex groups """
-    print('saving Zones vertex groups')
-    current_object = bpy.context.object
-    current_mode = bpy.context.mode
-    mesh.update_from_editmode()
-    vgroup_names = {vgroup.index: vgroup.name for vgroup in mesh.vertex_groups}
-    for v in mesh.data.vertices:
-        for g in v.groups:
-            vg_name = vgroup_names.get(g.group, None)
-            if not vg_name:
-                continue
-            co = None
-            if vg_name.startswith('ZVG') or vg_name.startswith("ALIGN_"):
-                co = ";".join([str(v.co[0]), str(v.co[1]), str(v.co[2])])
-                mesh[vg_name] = co
-    select_object(current_object.name)
-    if current_mode == 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT')
-    elif current_mode == 'EDIT_MESH':
-        bpy.ops.object.mode_set(mode='EDIT')
+def mode_set(mode):
+    """ Switch the object mode, every switch is counted in the active trace. """
+    trace.count('mode_set')
+    bpy.ops.object.mode_set(mode=mode)
+
+
+def mesh_counts(obj):
+    """ Vertex, edge and face counts of a mesh object, in edit mode too. """
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(obj.data)
+        return {'vertices': len(bm.verts), 'edges': len(bm.edges), 'faces': len(bm.faces)}
+    return {'vertices': len(obj.data.vertices), 'edges': len(obj.data.edges), 'faces': len(obj.data.polygons)}
+
+
+def read_mesh_arrays(obj):
+    """ Read vertex coordinates, vertex selection and edges of an object in bulk.
+
+        Works in edit mode too: the edit-mesh is written to the mesh data first,
+        so the array indices match the BMVert indices after index_update().
+
+        Input:  mesh object
+        Output: float array (N x 3), bool array (N), int array (E x 2)
+    """
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+        trace.count('update_from_editmode')
+    mesh = obj.data
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    select = np.empty(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get('select', select)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+
+    return co.reshape(-1, 3), select, edges.reshape(-1, 2)
+
+
+ZONE_PREFIXES = ('ZVG', 'ALIGN_') # zone arrow and aligning vertex groups
+SNAPSHOT_LAYER = 'zone_vertex_id'
+
+
+def vertex_group_members(obj, bm, prefixes=ZONE_PREFIXES):
+    """ Collect the member vertices of the vertex groups with the given name prefixes,
+        in one pass over the deform layer of an edit-mesh.
+
+        Input:  mesh object in edit mode, its BMesh, group name prefixes
+        Output: dict{group name: list(BMVert)}
+    """
+    wanted = {vgroup.index: vgroup.name for vgroup in obj.vertex_groups if vgroup.name.startswith(prefixes)}
+    deform = bm.verts.layers.deform.active
+    if not wanted or deform is None:
+        return {}
+
+    members = {name: [] for name in wanted.values()}
+    for v in bm.verts:
+        for group in v[deform].keys():
+            if group in wanted:
+                members[wanted[group]].append(v)
+    return members
+
+
+def save_vertex_groups(obj, bm, prefixes=ZONE_PREFIXES):
+    """ Saves the coordinates of all zone arrow and aligning vertex groups
+
+        One ID property per group, {'id': vertex ids, 'co': flat x, y, z float
+        array}. The ids are written to the SNAPSHOT_LAYER int layer of the
+        vertices, which stays with them when the cut renumbers the vertices, so
+        restore_vertex_groups finds them again. The apply pipeline does not
+        restore them, the layer is kept until restore_vertex_groups is called.
+        Selection and mode are left as they are.
+
+        Input:  mesh object in edit mode, its BMesh
+        Output: number of saved vertices
+    """
+    layer = bm.verts.layers.int.get(SNAPSHOT_LAYER)
+    if layer is not None:
+        bm.verts.layers.int.remove(layer)
+    members = vertex_group_members(obj, bm, prefixes)
+    if not any(members.values()):
+        return 0
+
+    # 0 is the default value of the layer, so the ids start from 1
+    layer = bm.verts.layers.int.new(SNAPSHOT_LAYER)
+    bm.verts.index_update()
+    for verts in members.values():
+        for v in verts:
+            v[layer] = v.index + 1
+    for vg_name, verts in members.items():
+        if verts:
+            obj[vg_name] = {'id': [v[layer] for v in verts], 'co': [c for v in verts for c in v.co]}
+    return len({v for verts in members.values() for v in verts})
+
+
+def restore_vertex_groups(obj, bm, prefixes=ZONE_PREFIXES):
+    """ Move the vertices saved by save_vertex_groups back to their saved
+        coordinates, found by their SNAPSHOT_LAYER ids, and remove the layer.
+
+        Input:  mesh object in edit mode, its BMesh
+        Output: number of restored vertices
+    """
+    layer = bm.verts.layers.int.get(SNAPSHOT_LAYER)
+    if layer is None:
+        return 0
+
+    saved = {}
+    for vgroup in obj.vertex_groups:
+        group = obj.get(vgroup.name) if vgroup.name.startswith(prefixes) else None
+        if hasattr(group, 'keys') and 'id' in group.keys():
+            saved.update(zip(group['id'], np.array(group['co'], dtype=np.float64).reshape(-1, 3).tolist()))
+
+    restored = 0
+    for v in bm.verts:
+        co = saved.get(v[layer])
+        if co is not None:
+            v.co = co
+            restored += 1
+    bm.verts.layers.int.remove(layer)
+    return restored
+
+
+def hide_markers():
+    """ Hide the landmark markers placed with MouseTo3D. """
+    from MouseTo3D import MarkerPool
+    MarkerPool.hide_all()
 
 
 def unselect_all():
@@ -250,7 +351,7 @@ def unselect_all():
 
     # selection in edit mode needs special clearing
     if bpy.context.scene.objects.active and bpy.context.scene.objects.active.mode == "EDIT":
-        bpy.ops.object.mode_set(mode="OBJECT")
+        mode_set("OBJECT")
 
     bpy.context.scene.objects.active = None
 
@@ -276,57 +377,11 @@ def select_object(obj, select=True):
     return obj
 
 
-class ControlPoints():
-
-    def __init__(self, control_set, height):
-        self._control_set = control_set
-        self.height = height
-        self.curve_max = self.find_max()
-        self.control_points_x = self.get_control_points_X()
-        self.control_points_y = self.get_control_points_Y()
-        self.control_points_limits = self.get_control_points_limits()
-
-    def find_max(self):
-        curve_data = []
-        for curve in self._control_set:
-            curve_data.append(1 - curve["start"]["position"]["y"])
-            curve_data.append(1 - curve["end"]["position"]["y"])
-            curve_data.append(1 - curve["start"]["control"]["y"])
-            curve_data.append(1 - curve["end"]["control"]["y"])
-        return max(curve_data)
-
-    def get_control_points_Y(self):
-        control_points = {}
-        for indx, segment in enumerate(self._control_set):
-            control_points[indx] = [((1 - segment["start"]["position"]["y"])/self.curve_max)*self.height]
-            control_points[indx].append(((1 - segment["start"]["control"]["y"])/self.curve_max)*self.height)
-            control_points[indx].append(((1 - segment["end"]["control"]["y"])/self.curve_max)*self.height)
-            control_points[indx].append(((1 - segment["end"]["position"]["y"])/self.curve_max)*self.height)
-        return control_points
-
-    def get_control_points_X(self):
-        control_points = {}
-        for indx, segment in enumerate(self._control_set):
-            control_points[indx] = [segment["start"]["position"]["x"]]
-            control_points[indx].append(segment["start"]["control"]["x"])
-            control_points[indx].append(segment["end"]["control"]["x"])
-            control_points[indx].append(segment["end"]["position"]["x"])
-        return control_points
-
-    def get_control_points_limits(self):
-        limits = {}
-        for indx, segment in enumerate(self._control_set):
-            limits[indx] = [min(self.control_points_x[indx])]
-            limits[indx].append(max(self.control_points_x[indx]))
-        return limits
-
-
-BL_MAIN_OBJ_NAME = bpy.data.objects['ImportedMesh'].name
-BL_SHAPE_TOOL_OBJ_NAME = bpy.data.objects['ShapeBezierCurve'].name
+# Default object names, the objects are looked up when a shape is applied
+BL_MAIN_OBJ_NAME = 'ImportedMesh'
+BL_SHAPE_TOOL_OBJ_NAME = 'ShapeBezierCurve'
 BL_SHAPE_PREVIEW_OBJ_NAME = BL_MAIN_OBJ_NAME
 
-print("------------------------ Matrix Approach ------------------------ ")
-
 # class ApplyDrawnShapeOperator(bpy.types.Operator):
 """Apply the custom drawn shape to the mesh """
 bl_idname = "debug.apply_drawn_shape"
@@ -335,529 +390,809 @@ bl_options = {'REGISTER', 'UNDO'}
 
 target_objname = BL_MAIN_OBJ_NAME
 
-height = bpy.props.FloatProperty(name="Height amount in mm", default=2)
-smooth_amount = bpy.props.IntProperty(name="Smooth amount", default=100)
-x_displacement = bpy.props.StringProperty(name="X displacement amounts", default="")
-y_displacement = bpy.props.StringProperty(name="Y displacement amounts", default="")
-preview = bpy.props.BoolProperty(name="Only preview shape", default=True)
 
+def operator_properties():
+    """ The properties of the apply drawn shape operator, created when it is registered. """
+    return {'height': bpy.props.FloatProperty(name="Height amount in mm", default=core.DEFAULT_HEIGHT),
+            'smooth_amount': bpy.props.IntProperty(name="Smooth amount", default=100),
+            'x_displacement': bpy.props.StringProperty(name="X displacement amounts", default=""),
+            'y_displacement': bpy.props.StringProperty(name="Y displacement amounts", default=""),
+            'preview': bpy.props.BoolProperty(name="Only preview shape", default=True)}
 
-def execute():
-    if BL_SHAPE_TOOL_OBJ_NAME not in bpy.data.objects.keys():
-        return {'CANCELLED'}
+
+class PreviewCache:
+    """ Shape region state kept between preview applies.
+
+        The cut-out region, the shape grid and the undisplaced vertex positions and
+        normals are stored after the first apply. While the target mesh and the shape
+        curve stay as the last preview left them, the next apply skips straight to
+        blend_curves and the displacement. A final (non-preview) apply takes the same
+        path and clears the cache afterwards.
+    """
+    target_key = None
+    shape_key = None
+    shape_grid = None # shapetool.core.ShapeGrid
+    base_co = None # float array (N x 3), undisplaced vertex coordinates
+    base_normals = None # float array (N x 3)
+
+    @staticmethod
+    def clear():
+        PreviewCache.target_key = None
+        PreviewCache.shape_key = None
+        PreviewCache.shape_grid = None
+        PreviewCache.base_co = None
+        PreviewCache.base_normals = None
+
+    @staticmethod
+    def is_valid(target_obj, shape_obj):
+        return (PreviewCache.shape_grid is not None and
+                PreviewCache.target_key == geometry_key(target_obj) and
+                PreviewCache.shape_key == geometry_key(shape_obj))
+
+    @staticmethod
+    def store_keys(target_obj, shape_obj):
+        PreviewCache.target_key = geometry_key(target_obj)
+        PreviewCache.shape_key = geometry_key(shape_obj)
+
+
+def geometry_key(obj, arrays=None):
+    """ Hash of the object geometry and transformation, used to detect changes between applies.
+
+        Input:  mesh or curve object, read_mesh_arrays of a mesh object if already read
+        Output: str
+    """
+    key = hashlib.sha1(np.array(obj.matrix_world, dtype=np.float64).tobytes())
+    if obj.type == 'MESH':
+        co, _, edges = arrays or read_mesh_arrays(obj)
+        key.update(co.tobytes())
+        key.update(edges.tobytes())
+    else:
+        for spline in obj.data.splines:
+            if spline.type == 'BEZIER':
+                points, attrs, size = spline.bezier_points, ('co', 'handle_left', 'handle_right'), 3
+            else:
+                points, attrs, size = spline.points, ('co',), 4
+            for attr in attrs:
+                values = np.empty(len(points) * size, dtype=np.float32)
+                points.foreach_get(attr, values)
+                key.update(values.tobytes())
+    return key.hexdigest()
+
+
+class ProjectionCache:
+    """ BVH trees of the projection targets, in the target object space.
+
+        Keyed by geometry_key, so a tree is built once per target geometry and
+        reused by every apply and preview until the target mesh changes. The least
+        recently used trees are dropped when more than SIZE are kept.
+    """
+    SIZE = 4
+    _trees = OrderedDict()
+
+    @staticmethod
+    def tree(obj):
+        # one read of the mesh for the key and for a new tree
+        arrays = read_mesh_arrays(obj)
+        key = geometry_key(obj, arrays)
+        try:
+            tree = ProjectionCache._trees[key]
+        except KeyError:
+            with trace.span('build_bvh'):
+                tree = build_bvh(obj, arrays[0])
+            ProjectionCache._trees[key] = tree
+            if len(ProjectionCache._trees) > ProjectionCache.SIZE:
+                ProjectionCache._trees.popitem(last=False)
+        else:
+            ProjectionCache._trees.move_to_end(key)
+            trace.count('bvh_reused')
+        return tree
+
+    @staticmethod
+    def clear():
+        ProjectionCache._trees.clear()
+
+
+def build_bvh(obj, co=None):
+    """ BVH tree of the object polygons, from arrays read with foreach_get.
+
+        Input:  mesh object, its vertex coordinates if already read
+        Output: mathutils.bvhtree.BVHTree
+    """
+    if co is None:
+        co, _, _ = read_mesh_arrays(obj)
+    mesh = obj.data
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+
+    polygons = [polygon.tolist() for polygon in np.split(loop_vertices, np.cumsum(loop_totals)[:-1])] if len(loop_totals) else []
+    return mathutils.bvhtree.BVHTree.FromPolygons(co.tolist(), polygons)
+
+
+def project_points(tree, points, mode='NEAREST', offset=0.001, directions=None):
+    """ Project points on the surface of a BVH tree, in one batch.
+
+        NEAREST works as the Shrinkwrap NEAREST_SURFACEPOINT method: the point moves
+        to the nearest surface point, keeping offset from the surface on the side it
+        came from. NORMAL casts a ray along the direction of each point, both ways,
+        and keeps the nearer hit, offset along the surface normal. Points without a
+        hit keep their position.
+
+        Input:  BVHTree, float array (N x 3), 'NEAREST' or 'NORMAL', offset,
+                float array (N x 3) directions for NORMAL
+        Output: float array (N x 3), bool array (N) projected points
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    projected = points.copy()
+    hit = np.zeros(len(points), dtype=bool)
+
+    if mode == 'NEAREST':
+        for i, co in enumerate(points.tolist()):
+            location, normal, _, distance = tree.find_nearest(co)
+            if location is None:
+                continue
+            if distance > 1e-6:
+                projected[i] = location + (Vector(co) - location) * (offset / distance)
+            else:
+                projected[i] = location + normal * offset
+            hit[i] = True
+    elif mode == 'NORMAL':
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        for i, (co, direction) in enumerate(zip(points.tolist(), directions.tolist())):
+            direction = Vector(direction)
+            hits = [tree.ray_cast(co, direction), tree.ray_cast(co, -direction)]
+            hits = [h for h in hits if h[0] is not None]
+            if not hits:
+                continue
+            location, normal, _, _ = min(hits, key=lambda h: h[3])
+            projected[i] = location + normal * offset
+            hit[i] = True
+    else:
+        raise ValueError("Unknown projection mode: {}".format(mode))
+
+    return projected, hit
+
+
+def shrinkwrap_object(obj, target_obj, mode='NEAREST', offset=0.001):
+    """ Project the vertices of a mesh object on the target mesh, in place.
+
+        Replaces adding and applying a Shrinkwrap modifier: the BVH tree of the target
+        comes from ProjectionCache and the vertices are read and written in bulk.
+
+        Input: mesh object, mesh object, see project_points
+    """
+    to_target = np.array(target_obj.matrix_world.inverted() * obj.matrix_world)
+    co, _, _ = read_mesh_arrays(obj)
+    co = co.astype(np.float64) @ to_target[:3, :3].T + to_target[:3, 3]
+
+    directions = None
+    if mode == 'NORMAL':
+        directions = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+        obj.data.vertices.foreach_get('normal', directions)
+        directions = directions.reshape(-1, 3) @ to_target[:3, :3].T
+
+    projected, hit = project_points(ProjectionCache.tree(target_obj), co, mode, offset, directions)
+    trace.count('projected_points', int(hit.sum()))
+
+    to_obj = np.linalg.inv(to_target)
+    projected = projected @ to_obj[:3, :3].T + to_obj[:3, 3]
+    obj.data.vertices.foreach_set('co', projected.astype(np.float32).reshape(-1))
+    obj.data.update()
+
+
+def cut_shape_region(target_obj, shape_obj):
+    """ Project the drawn shape on the target mesh and cut it out as a region.
+
+        Leaves the target in edit mode with the 'modifier_group' (shape region) and
+        'shape_intersection_group' (shape loop) vertex groups defined and the shape
+        loop selected.
+
+        Input: mesh object, curve object
+    """
 
     # hide manipulators
     # view3d_space = get_view3d_space()
     # view3d_space.transform_manipulators = set()
     # view3d_space.show_manipulator = False
 
-    target_obj = select_object(target_objname)
-    save_vertex_groups(target_obj)
+    target_obj = select_object(target_obj)
+    counts = lambda: mesh_counts(target_obj)
+
     duplicate_target_obj = None
 
-    # New stuff
     target_obj.hide = False
-    for obj in bpy.data.objects:
-        if 'Sphere' in obj.name:
-            obj.hide = True
-    # End of new stuff
+    hide_markers()
 
     select_object(target_obj.name)
-    bpy.ops.object.mode_set(mode='EDIT')
+    mode_set('EDIT')
+    with trace.span('save_vertex_groups'):
+        trace.count('saved_vertices', save_vertex_groups(target_obj, bmesh.from_edit_mesh(target_obj.data)))
+        bmesh.update_edit_mesh(target_obj.data)
     bpy.ops.mesh.select_all(action="DESELECT")
-    bpy.ops.object.mode_set(mode='OBJECT')
+    mode_set('OBJECT')
 
-    shape_obj = select_object(BL_SHAPE_TOOL_OBJ_NAME)
-    # create copy of the shape
-    bpy.ops.object.duplicate_move()
-    duplicate_shape = bpy.context.object
+    with trace.span('duplicate'):
+        select_object(shape_obj)
+        # create copy of the shape
+        bpy.ops.object.duplicate_move()
+        duplicate_shape = bpy.context.object
 
-    bpy.ops.object.convert(target="MESH")
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action="SELECT")
-    bpy.ops.mesh.vertices_smooth(repeat=2)
+    with trace.span('convert'):
+        bpy.ops.object.convert(target="MESH")
+        mode_set('EDIT')
+
+    with trace.span('smooth'):
+        bpy.ops.mesh.select_all(action="SELECT")
+        bpy.ops.mesh.vertices_smooth(repeat=2)
 
     bpy.ops.mesh.select_all(action="SELECT")
     define_new_group("shape_group", target_obj)
-    bpy.ops.object.mode_set(mode='OBJECT')
+    mode_set('OBJECT')
 
-    shape_obj = select_object(BL_SHAPE_TOOL_OBJ_NAME)
-    bpy.ops.object.modifier_add(type='SHRINKWRAP')
-    shape_obj.modifiers["Shrinkwrap"].target = bpy.data.objects[target_obj.name]
-    shape_obj.modifiers["Shrinkwrap"].offset = 0.001
-    shape_obj.modifiers["Shrinkwrap"].wrap_method = 'NEAREST_SURFACEPOINT'
-    bpy.ops.object.modifier_apply(modifier="Shrinkwrap")
+    with trace.span('shrinkwrap'):
+        shrinkwrap_object(duplicate_shape, target_obj, mode='NEAREST', offset=0.001)
 
-    unselect_all()
-    duplicate_shape.select = True
-    target_obj.select = True
-    bpy.context.scene.objects.active = target_obj
-    bpy.ops.object.join()
+    with trace.span('join', counts):
+        unselect_all()
+        duplicate_shape.select = True
+        target_obj.select = True
+        bpy.context.scene.objects.active = target_obj
+        bpy.ops.object.join()
 
     select_object(target_obj)
-    bpy.ops.object.mode_set(mode="EDIT")
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.mesh.normals_make_consistent(inside=False)
+    mode_set("EDIT")
+    with trace.span('normals_make_consistent'):
+        bpy.ops.mesh.select_all(action='SELECT')
+        bpy.ops.mesh.normals_make_consistent(inside=False)
 
     # -0.003 defines the amount of extrusion towards Origin
     bpy.ops.mesh.select_all(action='DESELECT')
     target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_group'].index
     bpy.ops.object.vertex_group_select()
 
-    bm = bmesh.from_edit_mesh(target_obj.data)
-    bm.verts.ensure_lookup_table()
-    edges = [e for e in bm.edges if e.select]
-    ret = bmesh.ops.extrude_edge_only(bm, edges=edges)
-    for elm in ret['geom']:
-        if isinstance(elm, bmesh.types.BMVert):
-            elm.co += -0.003 * elm.normal
-    bmesh.update_edit_mesh(target_obj.data)
+    with trace.span('extrude', counts):
+        bm = bmesh.from_edit_mesh(target_obj.data)
+        bm.verts.ensure_lookup_table()
+        edges = [e for e in bm.edges if e.select]
+        ret = bmesh.ops.extrude_edge_only(bm, edges=edges)
+        for elm in ret['geom']:
+            if isinstance(elm, bmesh.types.BMVert):
+                elm.co += -0.003 * elm.normal
+        bmesh.update_edit_mesh(target_obj.data)
     bpy.ops.object.vertex_group_select()
 
     bpy.ops.mesh.select_all(action='DESELECT')
     target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_group'].index
     bpy.ops.object.vertex_group_select()
 
-    bpy.ops.mesh.intersect()
-    bpy.ops.mesh.remove_doubles()
+    with trace.span('intersect', counts):
+        bpy.ops.mesh.intersect()
+    with trace.span('remove_doubles', counts):
+        bpy.ops.mesh.remove_doubles()
 
     define_new_group('shape_intersection_group', target_obj)
 
-    bpy.ops.mesh.select_all(action='DESELECT')
-    target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_group'].index
-    bpy.ops.object.vertex_group_select()
-    bpy.ops.mesh.delete(type='VERT')
-    bpy.ops.object.vertex_group_remove(all=False)
+    with trace.span('delete_shape', counts):
+        bpy.ops.mesh.select_all(action='DESELECT')
+        target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_group'].index
+        bpy.ops.object.vertex_group_select()
+        bpy.ops.mesh.delete(type='VERT')
+        bpy.ops.object.vertex_group_remove(all=False)
 
-    bpy.ops.mesh.select_all(action='DESELECT')
-    target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_intersection_group'].index
-    bpy.ops.object.vertex_group_select()
+        bpy.ops.mesh.select_all(action='DESELECT')
+        target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_intersection_group'].index
+        bpy.ops.object.vertex_group_select()
 
-    bpy.ops.mesh.delete_loose()
+        bpy.ops.mesh.delete_loose()
     bpy.ops.object.vertex_group_select()
 
     Logger.log('Correcting shape loop over socket surface')
-    clean_shape_loop(target_obj)
+    with trace.span('clean_shape_loop', counts):
+        count_loop_diagnostics(clean_shape_loop(target_obj))
 
-    bpy.ops.mesh.loop_to_region()
-    define_new_group('modifier_group', target_obj)
+    with trace.span('define_regions'):
+        bpy.ops.mesh.loop_to_region()
+        define_new_group('modifier_group', target_obj)
 
-    bpy.ops.mesh.region_to_loop()
-    define_new_group('shape_intersection_group', target_obj)
+        bpy.ops.mesh.region_to_loop()
+        define_new_group('shape_intersection_group', target_obj)
 
-    # New stuff from here
-    app = TestApplication()
 
-    curveXdata, curveYdata = app.get_curveXY()
+def read_vertex_normals(obj):
+    """ Read the vertex coordinates and normals of an object in bulk, in edit mode too.
 
-    time_start = time.time()
-    shape_grid, middle_vertex_X, middle_vertex_Y = make_grid(target_obj)
-    print("make_grid: %.4f sec" % (time.time() - time_start))
+        Input:  mesh object
+        Output: float arrays (N x 3) coordinates and normals
+    """
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+        trace.count('update_from_editmode')
+    vertices = obj.data.vertices
 
-    extrude_values = blend_curves(target_obj, shape_grid, middle_vertex_X, middle_vertex_Y, curveXdata, curveYdata)
+    co = np.empty(len(vertices) * 3, dtype=np.float32)
+    vertices.foreach_get('co', co)
+    normals = np.empty(len(vertices) * 3, dtype=np.float32)
+    vertices.foreach_get('normal', normals)
+    return co.reshape(-1, 3), normals.reshape(-1, 3)
 
-    # Extrude
-    bm = bmesh.from_edit_mesh(target_obj.data)
-    bm.verts.ensure_lookup_table()
-    for indx, value in extrude_values.items():
-        bm.verts[indx].co += bm.verts[indx].normal * value
-    bmesh.update_edit_mesh(bpy.context.object.data)
 
-    # Apply smooth modifier
-    bpy.ops.object.modifier_add(type='SMOOTH')
-    bpy.context.object.modifiers["Smooth"].vertex_group = "modifier_group"
-    bpy.context.object.modifiers["Smooth"].iterations = 5
-    bpy.context.object.modifiers["Smooth"].factor = 0.5
-    bpy.ops.object.mode_set(mode="OBJECT")
+def select_vertices(obj, indices):
+    """ Select only the given vertices, and the edges between them, of an object in object mode.
 
-    ############## test exporting zbuff to file ##############
-    #pixels = [bgl.Buffer(bgl.GL_BYTE, 1024 * 768),
-    #          bgl.Buffer(bgl.GL_BYTE, 1024 * 768),
-    #          bgl.Buffer(bgl.GL_BYTE, 1024 * 768)]
-    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_RED, bgl.GL_BYTE, pixels[0])
-    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_GREEN, bgl.GL_BYTE, pixels[1])
-    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_BLUE, bgl.GL_BYTE, pixels[2])
-    #dmp = open("testfile.txt", "w")
-    #dmp.close()
-    #print(pixels[0])
-    bj = bpy.context.object
-    sensors = obj.game.sensors
-    controllers = obj.game.controllers
-    actuators = obj.game.actuators
-    bpy.ops.logic.sensor_add(type="ALWAYS", object=obj.name)
-    bpy.ops.logic.controller_add(type="LOGIC_AND", object=obj.name)
-    bpy.ops.logic.actuator_add(type="ACTION", object=obj.name)
-    return {'FINISHED'}
+        Input: mesh object, int array of vertex indices
+    """
+    mesh = obj.data
+    select = np.zeros(len(mesh.vertices), dtype=bool)
+    select[indices] = True
+    mesh.vertices.foreach_set('select', select)
+
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    mesh.edges.foreach_set('select', select[edges.reshape(-1, 2)].all(axis=1))
+    mesh.polygons.foreach_set('select', np.zeros(len(mesh.polygons), dtype=bool))
 
 
-def test_height(h=15):
-    return  h
+def write_displacement(obj, indices, values, base_co=None, base_normals=None):
+    """ Move the vertices along their normals by the extrude values, with a single foreach_set.
 
-def blend_curves(target_obj, shape_grid, middle_vertex_X, middle_vertex_Y, curveXdata=[], curveYdata=[]):
-    """ Blend the user defined (X,Y) curves and store each vertex value in a dictionary.
+        The displacement starts from base_co and base_normals when given, so
+        applying it again with new values does not add up; otherwise from the
+        current mesh. The object has to be in object mode.
 
-        Input: mesh object
-        Output: dict{BMVert.index : extrude_value}
+        Input: mesh object, int array (M) vertex indices, float array (M) extrude values,
+               float arrays (N x 3)
     """
+    if base_co is None or base_normals is None:
+        base_co, base_normals = read_vertex_normals(obj)
 
-    # curveXdata = json.loads(self.x_displacement)
-    # curveYdata = json.loads(self.y_displacement)
-    height = test_height()
+    co = core.displace(base_co, base_normals, indices, values)
+    obj.data.vertices.foreach_set('co', co.reshape(-1))
+    obj.data.update()
 
-    # Handle the no curves case
-    if not(curveXdata and curveYdata):
-        extrude_values = {}
-        for v_index, data in shape_grid.items():
-            extrude_values[v_index] = height/1000
 
-        # restore state and selection
-        bpy.ops.object.mode_set(mode="EDIT")
-        bpy.ops.mesh.select_all(action='DESELECT')
-        target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_intersection_group'].index
-        bpy.ops.object.vertex_group_select()
+def shape_mesh(shape_obj, target_obj):
+    """ The drawn shape as mesh data, without converting or modifying the shape object.
 
-        return extrude_values
+        Input:  curve object, mesh object
+        Output: list(Vector) coordinates in the target object space, list of (int, int) edges
+    """
+    mesh = shape_obj.to_mesh(bpy.context.scene, True, 'PREVIEW')
+    try:
+        matrix = target_obj.matrix_world.inverted() * shape_obj.matrix_world
+        co = [matrix * v.co for v in mesh.vertices]
+        edges = [tuple(e.vertices) for e in mesh.edges]
+    finally:
+        bpy.data.meshes.remove(mesh)
+    return co, edges
+
+
+def select_only(bm, verts):
+    """ Select the given vertices of an edit-mesh and flush the selection to
+        the edges and faces between them, like vertex_group_select does.
+    """
+    for elements in (bm.verts, bm.edges, bm.faces):
+        for elm in elements:
+            elm.select = False
+    for v in verts:
+        v.select = True
+    bm.select_flush(True)
 
-    # separate the curve data
-    curveX = ControlPoints(curveXdata, height)
-    curveY = ControlPoints(curveYdata, height)
 
-    # caluclate the extrusion
-    columnData_extruded = calculate_extrusion(shape_grid, curveX, 'row', middle_vertex_X)
-    rowData_extruded = calculate_extrusion(shape_grid, curveY, 'column', middle_vertex_Y)
+def assign_vertex_group(obj, bm, group_name, verts):
+    """ Define a new group on an edit-mesh from a set of vertices, without the
+        selection and vertex group operators.
 
+        Input:  mesh object in edit mode, its BMesh, group name, iterable of BMVerts
+        Output: vertex group index
+    """
+    if group_name in obj.vertex_groups.keys():
+        obj.vertex_groups.remove(obj.vertex_groups[group_name])
+    group_index = obj.vertex_groups.new(name=group_name).index
+    deform = bm.verts.layers.deform.verify()
+    for v in verts:
+        v[deform][group_index] = 1.0
+    return group_index
+
+
+def loop_region(loop_edges):
+    """ The faces of the smaller region bounded by the loop edges, the BMesh
+        counterpart of loop_to_region.
+
+        Both sides of the loop are flood filled in turns, one face at a time; the
+        side which runs out of faces first is the smaller one, so the larger side
+        is never walked completely.
+
+        Input:  set(BMEdge)
+        Output: set(BMFace)
+    """
+    seed = next((e for e in loop_edges if len(e.link_faces) == 2), None)
+    if seed is None:
+        return set()
+
+    sides = [({face}, [face]) for face in seed.link_faces]
+    while True:
+        for visited, front in sides:
+            if not front:
+                if all(face in visited for face in seed.link_faces):
+                    Logger.warning("Shape loop is not closed, the region covers the whole mesh part")
+                return visited
+            for edge in front.pop().edges:
+                if edge in loop_edges:
+                    continue
+                for face in edge.link_faces:
+                    if face not in visited:
+                        visited.add(face)
+                        front.append(face)
+
+
+def apply_shape_bmesh(target_obj, shape_obj, curveXdata, curveYdata, height=None,
+                      gap_threshold=angular.GAP_THRESHOLD, weight_x=0.5):
+    """ Apply the drawn shape to the target mesh in a single edit-mesh session.
+
+        The stages of cut_shape_region and apply_shape, done on one BMesh with
+        bmesh.ops and sets of vertices instead of selection, vertex group and mode
+        switching operators: the mesh is converted to the edit-mesh once, and back
+        once at the end. bmesh.ops has no counterpart of mesh.intersect, it is the
+        only mesh operator left and works on the same edit-mesh.
+
+        The shape curve is not converted or shrinkwrapped itself, its mesh data is
+        projected on the target (see project_points) while it is added to the BMesh.
+
+        Input: mesh object, curve object, curve control sets, height in mm,
+               gap threshold in degrees, weight of the X curve
+    """
+    if height is None:
+        height = core.DEFAULT_HEIGHT
+
+    target_obj = select_object(target_obj)
+    target_obj.hide = False
+    hide_markers()
+
+    with trace.span('convert'):
+        shape_co, shape_edges = shape_mesh(shape_obj, target_obj)
+    tree = ProjectionCache.tree(target_obj)
+
+    mode_set('EDIT')
     bm = bmesh.from_edit_mesh(target_obj.data)
-    bm.verts.ensure_lookup_table()
-    # blend the extruded values by doing weighted average (consider revision) and store the result in a dictionary
-    extrude_values = {}
-    for v_index, value in columnData_extruded.items():
-        if bm.verts[v_index].tag:
-            continue
-        else:
-            extrude_values[v_index] = value/1000
-            if v_index == middle_vertex_X['vertex'].index:
-                bm.verts[v_index].tag = True
+    counts = lambda: {'vertices': len(bm.verts), 'edges': len(bm.edges), 'faces': len(bm.faces)}
+
+    with trace.span('save_vertex_groups'):
+        trace.count('saved_vertices', save_vertex_groups(target_obj, bm))
+
+    with trace.span('join', counts):
+        shape_verts = [bm.verts.new(co) for co in shape_co]
+        shape_edges = [bm.edges.new((shape_verts[a], shape_verts[b])) for a, b in shape_edges]
+
+    with trace.span('smooth'):
+        for _ in range(2):
+            bmesh.ops.smooth_vert(bm, verts=shape_verts, factor=0.5,
+                                  use_axis_x=True, use_axis_y=True, use_axis_z=True)
+
+    # Shrinkwrap NEAREST_SURFACEPOINT, keeping 0.001 from the surface
+    with trace.span('shrinkwrap'):
+        projected, _ = project_points(tree, [v.co[:] for v in shape_verts], mode='NEAREST', offset=0.001)
+        for v, co in zip(shape_verts, projected.tolist()):
+            v.co = co
+
+    with trace.span('normals_make_consistent'):
+        bmesh.ops.recalc_face_normals(bm, faces=bm.faces[:])
+
+    # -0.003 defines the amount of extrusion towards Origin (the normal of a loose vertex)
+    with trace.span('extrude', counts):
+        ret = bmesh.ops.extrude_edge_only(bm, edges=shape_edges)
+        for elm in ret['geom']:
+            if isinstance(elm, bmesh.types.BMVert):
+                elm.co += -0.003 * elm.co.normalized()
+                shape_verts.append(elm)
+        shape_group = assign_vertex_group(target_obj, bm, 'shape_group', shape_verts)
+
+    with trace.span('intersect', counts):
+        select_only(bm, shape_verts)
+        bmesh.update_edit_mesh(target_obj.data)
+        bpy.ops.mesh.intersect()
+        bm = bmesh.from_edit_mesh(target_obj.data)
+        loop_verts = [v for v in bm.verts if v.select]
+
+    with trace.span('remove_doubles', counts):
+        bmesh.ops.remove_doubles(bm, verts=loop_verts, dist=0.0001)
+        loop_verts = [v for v in loop_verts if v.is_valid]
+
+    with trace.span('delete_shape', counts):
+        deform = bm.verts.layers.deform.verify()
+        bmesh.ops.delete(bm, geom=[v for v in bm.verts if shape_group in v[deform]], context=1)
+        target_obj.vertex_groups.remove(target_obj.vertex_groups['shape_group'])
+
+        loop_verts = {v for v in loop_verts if v.is_valid}
+        loose_edges = [e for v in loop_verts for e in v.link_edges if not e.link_faces]
+        bmesh.ops.delete(bm, geom=list(set(loose_edges)), context=2)
+        loose_verts = [v for v in loop_verts if v.is_valid and not v.link_edges]
+        bmesh.ops.delete(bm, geom=loose_verts, context=1)
+        loop_verts = [v for v in loop_verts if v.is_valid]
+        select_only(bm, loop_verts)
 
-    for v_index, value in rowData_extruded.items():
-        if bm.verts[v_index].tag:
-            continue
-        else:
-            extrude_values[v_index] = (extrude_values[v_index] + value/1000)/2
+    Logger.log('Correcting shape loop over socket surface')
+    with trace.span('clean_shape_loop', counts):
+        count_loop_diagnostics(clean_shape_loop(target_obj))
+
+    with trace.span('define_regions'):
+        region = loop_region({e for e in bm.edges if e.select})
+        region_verts = {v for face in region for v in face.verts}
+        loop_edges = [e for face in region for e in face.edges
+                      if sum(1 for f in e.link_faces if f in region) == 1]
+        border_verts = {v for e in loop_edges for v in e.verts}
+        assign_vertex_group(target_obj, bm, 'modifier_group', region_verts)
+        assign_vertex_group(target_obj, bm, 'shape_intersection_group', border_verts)
+
+    with trace.span('make_grid'):
+        bm.verts.index_update()
+        region_index = np.array([v.index for v in region_verts], dtype=np.int64)
+        co = np.zeros((len(bm.verts), 3))
+        co[region_index] = np.array([v.co[:] for v in region_verts]).reshape(-1, 3)
+        region_select = np.zeros(len(bm.verts), dtype=bool)
+        region_select[region_index] = True
+        border_select = np.zeros(len(bm.verts), dtype=bool)
+        border_select[[v.index for v in border_verts]] = True
+        edges = np.array([[v.index for v in e.verts] for e in loop_edges], dtype=np.int64).reshape(-1, 2)
+        shape_grid = core.make_grid(co, region_select, border_select, edges, gap_threshold)
+
+    with trace.span('blend_curves'):
+        indices, values = core.blend_curves(shape_grid, curveXdata, curveYdata, height, weight_x)
+
+    select_only(bm, border_verts)
+    bm.normal_update()
+    bmesh.update_edit_mesh(target_obj.data)
+    mode_set("OBJECT")
 
-    bmesh.update_edit_mesh(bpy.context.object.data)
+    with trace.span('displace'):
+        write_displacement(target_obj, indices, values)
 
-    # restore state and selection
-    bpy.ops.object.mode_set(mode="EDIT")
-    bpy.ops.mesh.select_all(action='DESELECT')
-    target_obj.vertex_groups.active_index = target_obj.vertex_groups['shape_intersection_group'].index
-    bpy.ops.object.vertex_group_select()
+    with trace.span('smooth_modifier'):
+        smooth = target_obj.modifiers.get("Smooth") or target_obj.modifiers.new("Smooth", 'SMOOTH')
+        smooth.vertex_group = "modifier_group"
+        smooth.iterations = 5
+        smooth.factor = 0.5
 
-    return extrude_values
 
-# helper class to prevent dicts
-class BorderVtxMap(object):
-    def __init__(self, bmv=None, col=0, isBorder=False):
-        self.bmvert = bmv
-        self.index = col
-        self.isBorder = isBorder
+def add_logic_bricks():
+    """ Add the game logic bricks to the last object. """
+    obj = bpy.data.objects[-1]
+    bpy.ops.logic.sensor_add(type="ALWAYS", object=obj.name)
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object=obj.name)
+    bpy.ops.logic.actuator_add(type="ACTION", object=obj.name)
 
 
+def execute(curveXdata=None, curveYdata=None, height=None, preview=True, trace_file=None, use_bmesh=False,
+            weight_x=0.5, target_name=None, shape_name=None):
+    """ Apply the drawn shape to the target mesh.
 
-def make_grid(obj):
-    """ Create a 2D map of the shape vertices, where each vertex has a unique column and row.
-        Add "boundaries" which will outline the shape
+        Every stage is traced (see shapetool.trace.last()) and the summary is logged.
+        With trace_file, the trace is also exported - in Chrome trace format if the
+        name ends with '.trace', as JSON otherwise. With use_bmesh, the shape is
+        applied by apply_shape_bmesh in a single edit-mesh session. weight_x is the
+        weight of the X curve when the X and Y curve extrusions are blended.
+        target_name and shape_name default to the ImportedMesh and ShapeBezierCurve objects.
+        height is in mm, core.DEFAULT_HEIGHT if not given.
     """
+    if height is None:
+        height = core.DEFAULT_HEIGHT
+    tracer = trace.start('apply_shape_bmesh' if use_bmesh else 'apply_shape')
+    try:
+        return apply_shape(curveXdata, curveYdata, height, preview, use_bmesh, weight_x, target_name, shape_name)
+    finally:
+        trace.stop()
+        Logger.info(tracer.summary())
+        Logger.flush()
+        if trace_file:
+            tracer.write(trace_file, format='chrome' if trace_file.endswith('.trace') else 'json')
+
+
+def apply_shape(curveXdata, curveYdata, height, preview, use_bmesh=False, weight_x=0.5, target_name=None,
+                shape_name=None):
+    target_name = target_name or target_objname
+    shape_name = shape_name or BL_SHAPE_TOOL_OBJ_NAME
+    if shape_name not in bpy.data.objects.keys() or target_name not in bpy.data.objects.keys():
+        return {'CANCELLED'}
 
-    # Find the first quadrant and first vertex that lays in this first quadrant
-    bm = bmesh.from_edit_mesh(obj.data)
-    bm.verts.ensure_lookup_table()
-    verts = [v for v in bm.verts if v.select]
+    if curveXdata is None or curveYdata is None:
+        app = TestApplication()
+        curveXdata, curveYdata = app.get_curveXY()
+
+    target_obj = bpy.data.objects[target_name]
+    shape_obj = bpy.data.objects[shape_name]
+
+    if use_bmesh:
+        # Nothing of the single session is kept for the preview
+        PreviewCache.clear()
+        apply_shape_bmesh(target_obj, shape_obj, curveXdata, curveYdata, height, weight_x=weight_x)
+        add_logic_bricks()
+        return {'FINISHED'}
+
+    if PreviewCache.is_valid(target_obj, shape_obj):
+        # Only the curves or the height changed since the last preview - reuse the
+        # cut-out region and grid, also for the final apply
+        with trace.span('reuse_grid'):
+            select_object(target_obj)
+        full_run = False
+    else:
+        PreviewCache.clear()
+        cut_shape_region(target_obj, shape_obj)
 
-    for v in verts:
-        v.tag = True
-    bmesh.update_edit_mesh(bpy.context.object.data)
+        with trace.span('make_grid'):
+            PreviewCache.shape_grid = make_grid(target_obj)
 
-    obj.vertex_groups.active_index = obj.vertex_groups['modifier_group'].index
-    bpy.ops.object.vertex_group_select()
+        # leaving edit mode writes the edit-mesh back, the normals are read after it
+        mode_set("OBJECT")
+        PreviewCache.base_co, PreviewCache.base_normals = read_vertex_normals(target_obj)
+        full_run = True
 
-    bm = bmesh.from_edit_mesh(obj.data)
-    bm.verts.index_update()
-    bm.verts.ensure_lookup_table()
-    verts = [v for v in bm.verts if v.select]
+    with trace.span('blend_curves'):
+        indices, values = blend_curves(PreviewCache.shape_grid, curveXdata, curveYdata, height, weight_x)
 
-    # Create an initial map of all vertices based on the shape limits
-    sorted_initial_vert_map = get_shape_limits(verts)
+    # Extrude
+    with trace.span('displace'):
+        write_displacement(target_obj, indices, values, PreviewCache.base_co, PreviewCache.base_normals)
+        shape_grid = PreviewCache.shape_grid
+        select_vertices(target_obj, shape_grid.index[shape_grid.border])
 
-    # Create the shape grid and sort by x-coordinate first
-    shape_grid = {}
-    inner_columns = {}
-    outer_columns = {}
+    # Apply smooth modifier
+    with trace.span('smooth_modifier'):
+        if "Smooth" not in target_obj.modifiers:
+            bpy.ops.object.modifier_add(type='SMOOTH')
+        bpy.context.object.modifiers["Smooth"].vertex_group = "modifier_group"
+        bpy.context.object.modifiers["Smooth"].iterations = 5
+        bpy.context.object.modifiers["Smooth"].factor = 0.5
+
+    if not preview:
+        PreviewCache.clear()
+    else:
+        PreviewCache.store_keys(target_obj, shape_obj)
 
-    for indx, v in enumerate(sorted_initial_vert_map):
-        if v.tag:
-            shape_grid[v.index] = {"vertex": v,
-                                   "column": indx,
-                                   "border_vertex": True}
+    ############## test exporting zbuff to file ##############
+    #pixels = [bgl.Buffer(bgl.GL_BYTE, 1024 * 768),
+    #          bgl.Buffer(bgl.GL_BYTE, 1024 * 768),
+    #          bgl.Buffer(bgl.GL_BYTE, 1024 * 768)]
+    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_RED, bgl.GL_BYTE, pixels[0])
+    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_GREEN, bgl.GL_BYTE, pixels[1])
+    #bgl.glReadPixels(0, 0, 1024, 768, bgl.GL_BLUE, bgl.GL_BYTE, pixels[2])
+    #dmp = open("testfile.txt", "w")
+    #dmp.close()
+    #print(pixels[0])
+    if full_run:
+        add_logic_bricks()
+    return {'FINISHED'}
 
-            outer_columns[indx] = {"vertex": v.index}
-        else:
-            shape_grid[v.index] = {"vertex": v,
-                                   "column": indx}
 
-            inner_columns[indx] = {"vertex": v.index}
+def apply_job(job):
+    """ Apply the shapes of a batch job (see shapetool.batch) to the open file and save it.
 
-    # Sort by z-coordinate
-    verts_z = {v.index: v.co.z for v in verts}
-    sorted_verts_z = sorted(verts_z, key=(lambda k: verts_z[k]), reverse=True)
+        The Smooth modifier of every shape but the last is applied, as the next
+        shape redefines the 'modifier_group'. The traces of the shapes are written
+        as JSON to job['trace'].
 
-    no_key_err = ShapeToolAsserts.ERR_CODES.NO_KEY_ERROR
-    if (ShapeToolAsserts.check_dict_entries(sorted_verts_z, shape_grid) == no_key_err):
-        Logger.log("Error occured: {}, falling back to default extrusion".format(ShapeToolAsserts.errno()))
-        x_displacement = str(0)
-        y_displacement = str(0)
-        smooth_amount = 5
-        return shape_grid, None, None
+        Input:  dict{'target', 'shapes', 'curves': {'x', 'y'}, 'height', 'output', 'trace'},
+                height in mm, core.DEFAULT_HEIGHT if not given
+        Output: dict{shape name: trace as a dict}
+    """
+    import json
+
+    curves = job.get('curves') or {}
+    traces = {}
+    for i, shape_name in enumerate(job['shapes']):
+        result = execute(curves.get('x'), curves.get('y'), job.get('height', core.DEFAULT_HEIGHT), preview=False,
+                         use_bmesh=job.get('use_bmesh', False), target_name=job.get('target'),
+                         shape_name=shape_name)
+        if result != {'FINISHED'}:
+            raise RuntimeError("Shape {} was not applied: {}".format(shape_name, result))
+        traces[shape_name] = trace.last().to_dict()
+
+        if i < len(job['shapes']) - 1:
+            select_object(job.get('target') or target_objname)
+            bpy.ops.object.modifier_apply(modifier="Smooth")
+
+    if job.get('output'):
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(job['output']), copy=True)
+    if job.get('trace'):
+        with open(job['trace'], 'w') as f:
+            json.dump(traces, f)
+    return traces
+
+
+def blend_curves(shape_grid, curveXdata=[], curveYdata=[], height=None, weight_x=0.5):
+    """ Blend the user defined (X,Y) curves into one extrude value per vertex.
+        See shapetool.core.blend_curves.
+
+        Input:  shapetool.core.ShapeGrid, curve control sets, height in mm, weight of the X curve
+        Output: int array (M) vertex indices, float array (M) extrude values
+    """
 
-    inner_rows = {}
-    outer_rows = {}
+    # curveXdata = json.loads(self.x_displacement)
+    # curveYdata = json.loads(self.y_displacement)
+    if height is None:
+        height = core.DEFAULT_HEIGHT
 
-    bm.verts.index_update()
+    return core.blend_curves(shape_grid, curveXdata, curveYdata, height, weight_x)
 
-    for indx, v in enumerate(sorted_verts_z):
-        if bm.verts[v].tag:
-            shape_grid[v].update(row=indx)
-            outer_rows[indx] = {"vertex": bm.verts[v].index}
-        else:
-            shape_grid[v].update(row=indx)
-            inner_rows[indx] = {"vertex": bm.verts[v].index}
 
-    bmesh.update_edit_mesh(bpy.context.object.data)
+def make_grid(obj, gap_threshold=angular.GAP_THRESHOLD):
+    """ Create a 2D map of the shape vertices, where each vertex has a unique column and row.
+        Add "boundaries" which will outline the shape
 
-    # Add boundaries to the new 2D grid by looping through the shape loop vertices.
-    # First sort which of the edge vertices is larger (row/column wise) and find the
-    # vertices that have row/column between these two edge vertices. Then take either
-    # column/row value as the boundary for the vertex's row/column.
-    bpy.ops.mesh.select_all(action='DESELECT')
-    obj.vertex_groups.active_index = obj.vertex_groups['shape_intersection_group'].index
-    bpy.ops.object.vertex_group_select()
+        The selected shape loop on entry marks the border vertices. The grid is made
+        by shapetool.core.make_grid over arrays read with foreach_get; its vertex
+        indices are the mesh (and BMVert) indices.
 
-    bm = bmesh.from_edit_mesh(obj.data)
-    edges = [e for e in bm.edges if e.select]
-    for v in bm.verts:
-        v.select = False
-    for e in edges:
-        column_A = shape_grid[e.verts[0].index]['column']
-        column_B = shape_grid[e.verts[1].index]['column']
-        if column_A > column_B:
-            column_B, column_A = column_A, column_B
-        row_A = shape_grid[e.verts[0].index]['row']
-        row_B = shape_grid[e.verts[1].index]['row']
-        if row_A > row_B:
-            row_B, row_A = row_A, row_B
-        middle_columns = [column for column in range(column_A + 1, column_B)]
-        middle_rows = [row for row in range(row_A + 1, row_B)]
-
-        for column in middle_columns:
-            try:
-                vertex = shape_grid[inner_columns[column]['vertex']]
-            except KeyError:
-                pass
-            else:
-                row_1 = shape_grid[outer_columns[column_A]['vertex']]['row']
-                row_2 = shape_grid[outer_columns[column_B]['vertex']]['row']
-                if 'column_rows' in vertex.keys():
-                    vertex['column_rows'].append(row_1)
-                else:
-                    vertex.update(column_rows=[row_1])
-        for row in middle_rows:
-            try:
-                vertex = shape_grid[inner_rows[row]['vertex']]
-            except KeyError:
-                pass
-            else:
-                column_1 = shape_grid[outer_rows[row_A]['vertex']]['column']
-                column_2 = shape_grid[outer_rows[row_B]['vertex']]['column']
-                if 'row_columns' in vertex.keys():
-                    vertex['row_columns'].append(column_1)
-                else:
-                    vertex.update(row_columns=[column_1])
-
-    # Leave only the closest boundary rows/columns to the current vertex
-    for v in shape_grid.keys():
-        if 'border_vertex' not in shape_grid[v].keys():
-            vertex = shape_grid[v]
-            row_A = min(vertex['row_columns'])
-            row_B = max(vertex['row_columns'])
-            column_A = min(vertex['column_rows'])
-            column_B = max(vertex['column_rows'])
-            for column in vertex['row_columns']:
-                if column > vertex['column'] and column <= row_B:
-                    row_B = column
-                elif column < vertex['column'] and column >= row_A:
-                    row_A = column
-            for row in vertex['column_rows']:
-                if row > vertex['row'] and row <= column_B:
-                    column_B = row
-                elif row < vertex['row'] and row >= column_A:
-                    column_A = row
-            vertex['row_columns'] = (row_A, row_B)
-            vertex['column_rows'] = (column_A, column_B)
-
-    grid_mid = round(len(shape_grid)/2)
-    Logger.log("Grid mid: {}".format(grid_mid))
+        Input:  mesh object in edit mode, gap threshold in degrees
+        Output: shapetool.core.ShapeGrid
+    """
+    # The shape loop is selected on entry - these are the border vertices
+    _, border_select, _ = read_mesh_arrays(obj)
 
-    try:
-        middle_vertex_Y = shape_grid[inner_columns[grid_mid]['vertex']]
-    except KeyError:
-        middle_vertex_Y = shape_grid[outer_columns[grid_mid]['vertex']]
-    try:
-        middle_vertex_X = shape_grid[inner_rows[grid_mid]['vertex']]
-    except KeyError:
-        middle_vertex_X = shape_grid[outer_rows[grid_mid]['vertex']]
+    obj.vertex_groups.active_index = obj.vertex_groups['modifier_group'].index
+    bpy.ops.object.vertex_group_select()
 
-    bmesh.update_edit_mesh(bpy.context.object.data)
+    co, region_select, edges = read_mesh_arrays(obj)
+    shape_grid = core.make_grid(co, region_select, border_select, edges, gap_threshold)
+    if not len(shape_grid):
+        Logger.warning("The shape region is empty, nothing to extrude")
+        return shape_grid
 
-    return shape_grid, middle_vertex_X, middle_vertex_Y
+    Logger.debug("Grid mid: {}, middle X: {}, middle Y: {}", round(len(shape_grid)/2),
+                 shape_grid.vertex(shape_grid.middle_X), shape_grid.vertex(shape_grid.middle_Y))
+    return shape_grid
 
 
 def create_shape_vertex_map(shape_min, shape_max, verts):
     """ Create an initial vertices map of the shape, taking into account
         the shape limits (shape_min, shape_max). Can handle up to three quadrants.
+        See shapetool.core.create_shape_vertex_map.
 
     """
 
-    initial_vert_map = {}
-    verts_x_q1 = {v.index: v.co.x for v in verts if v.co.x > 0 and v.co.y > 0}
-    sorted_verts_x_q1 = sorted(verts_x_q1, key=(lambda k: verts_x_q1[k]), reverse=True)
-    initial_vert_map['Q1'] = sorted_verts_x_q1
+    co = np.array([v.co for v in verts], dtype=np.float64).reshape(-1, 3)
+    sorted_initial_vert_map = core.create_shape_vertex_map(verts.index(shape_min), verts.index(shape_max), co)
+    return [[verts[i].index for i in quadrant] for quadrant in sorted_initial_vert_map]
 
-    verts_x_q2 = {v.index: v.co.x for v in verts if v.co.x < 0 and v.co.y > 0}
-    sorted_verts_x_q2 = sorted(verts_x_q2, key=(lambda k: verts_x_q2[k]), reverse=True)
-    initial_vert_map['Q2'] = sorted_verts_x_q2
-
-    verts_x_q3 = {v.index: v.co.x for v in verts if v.co.x < 0 and v.co.y < 0}
-    sorted_verts_x_q3 = sorted(verts_x_q3, key=(lambda k: verts_x_q3[k]))
-    initial_vert_map['Q3'] = sorted_verts_x_q3
+#####################################################################################
+def get_shape_limits(verts, gap_threshold=angular.GAP_THRESHOLD):
+    """ Find the shape "beginning" and "end" in XY plane.
+        Rotate around the 0,0 origin and find the angles of all vertices against
+        origin, then sort by angle. The shape in 1 or 2 quadrants will have all
+        vertices sorted. If the shape crosses the 0/360 direction, there will be a
+        gap larger than gap_threshold degrees between a pair of vertices. Then the
+        gap becomes the beginning and the end of the list. Returns the reorganized
+        BMVert data as a list. See shapetool.angular.angular_order.
+    """
 
-    verts_x_q4 = {v.index: v.co.x for v in verts if v.co.x > 0 and v.co.y < 0}
-    sorted_verts_x_q4 = sorted(verts_x_q4, key=(lambda k: verts_x_q4[k]))
-    initial_vert_map['Q4'] = sorted_verts_x_q4
+    with trace.span('get_shape_limits'):
+        co = np.array([v.co for v in verts], dtype=np.float64).reshape(-1, 3)
+        order = angular.angular_order(co, gap_threshold)
 
-    shape_coverage = [key for key in initial_vert_map.keys() if len(initial_vert_map[key])]
+    if len(co):
+        Logger.debug("Min: {} Max: {}", co[:, 2].min(), co[:, 2].max())
+    return [verts[i] for i in order]
 
-    sorted_initial_vert_map = []
-    visited = []
-    for limit in [shape_min, shape_max]:
-        for quadrant in shape_coverage:
-            if limit.index in initial_vert_map[quadrant]:
-                sorted_initial_vert_map.append(initial_vert_map[quadrant])
-                visited.append(quadrant)
 
-    for quadrant in shape_coverage:
-        if quadrant not in visited:
-            sorted_initial_vert_map.insert(1, initial_vert_map[quadrant])
+def pair_gap_vertices(verts_at_limit):
+    """ Pair the vertices at the shape loop gaps by distance.
 
-    return sorted_initial_vert_map
+        Candidates are the nearest gap vertices from a k-d tree
+        (shapetool.loops.gap_candidates) that are not already connected to the
+        vertex by an edge.
 
-#####################################################################################
-def get_shape_limits(verts, offset=2):
-    """ Find the shape "beginning" and "end" in XY plane.
-        Rotate around the 0,0 origin, looping trough all vertices and finds their angles
-        against origin. Collect them into a mapped class, then sort by angle criteria,
-        the shape in 1 or 2 quadrants will have all vertices sorted. If 3 or 4 quadrants
-        are present, there will be a gap between a pair of vertices by given offset of
-        2 or more. There is a gap. Then rearrange the array by making the index of the 
-        gap a beginning of the array till the end of it. After that return the reorganized
-        BMVert data as a list
+        Input:  list(BMVert)
+        Output: list of (BMVert, BMVert)
     """
+    co = np.array([v.co[:] for v in verts_at_limit], dtype=np.float64).reshape(-1, 3)
+    position = {v: i for i, v in enumerate(verts_at_limit)}
+    joined = [(i, position[e.other_vert(v)]) for i, v in enumerate(verts_at_limit)
+              for e in v.link_edges if e.other_vert(v) in position]
+    distances, first, second = loops.gap_candidates(co, joined)
 
-    # helper mapper class to map a vertex to specific angle
-    # then sort by criteria and return the appropriate vtx
-    class VtxAngleMap(object):
-        def __init__(self, bmv, angle, idx):
-            self.bmvert = bmv
-            self.angle = angle
-            self.index = idx
-
-    def __comparator(a, b):
-        return  a > b
-
-    # reconsider using shellsort if vertexes goes over 3-4000...
-    def __ssort(data, len, cmp):
-
-        gap,i,j,tmp = 0,0,0,0
-        gap = int(len / 2)
-        while gap > 0:
-            for i in range (gap, len):
-                j = i - gap
-                while j >= 0 and cmp(data[j].angle, data[j+gap].angle):
-                    tmp = data[j]
-                    data[j] = data[j+gap]
-                    data[j+gap] = tmp
-                    j -= gap
-                i += 1
-            gap = int(gap/2)
-
-    # get an angle of a point in 2D by origin (0, 0)
-    def get_vertex_angle2(y, x):
-        theta_rad = atan2(y, x)
-        deg_fix = 0
-        if theta_rad < 0:
-            deg_fix = 360 # fix for negative degrees
-        theta_deg = (theta_rad / math.pi *180) + (deg_fix)
-        return theta_deg
-
-
-    start = time.time()
-
-    sorted_verts=[] # returned sorted verts by begin and end
-    vtxmap=[] # list of mapped values, helper for the sort and other checks
-    height_map=[]
-    min_z, max_z, height_diff = 0, 0, 0
-
-    for v in verts: # organize vtxmap with bmvert, angle and optional index
-        vtxmap.append(VtxAngleMap(v, get_vertex_angle2(v.co.y, v.co.x), v.index))
-        height_map.append(v.co.z)
-
-    min_z = min(height_map)
-    max_z = max(height_map)
-
-    Logger.log("Min: "+str(min_z) + " Max: "+str(max_z)+" Diff: "+str(height_diff)+"\n\n")
-
-    __ssort(vtxmap, len(vtxmap), __comparator) # sort by the angle
-
-
-    for v in vtxmap:
-        Logger.log("Angles: "+ str(v.angle))
-
-    # find the gap - it's gap if the difference between 2 angles is more than 2 (hardcoded for now)
-    for i in range(0, len(vtxmap)):
-        safe_index = 0
-        if (i + 1) >= len(vtxmap):
-            safe_index = len(vtxmap) - 1
-        else:
-            safe_index = i + 1
-
-        if vtxmap[safe_index].angle - vtxmap[i].angle > offset: # it's a gap
-            # do the list vertex that starts the gap
-            # will be the start of the new list
-            # and the second vertex will be at the end
-            j = i
-            h = j
-            while j >=0:
-                sorted_verts.append(vtxmap[j].bmvert)
-                j -= 1
-            j = len(vtxmap)-1
-            while j > h:
-                sorted_verts.append(vtxmap[j].bmvert)
-                j -= 1
-            break
-    else: # we are in one or two quadrants...
-        for i in range(0, len(vtxmap)):
-            sorted_verts.append(vtxmap[i].bmvert)
-
-    Logger.log("Function cost:{}".format(time.time() - start))
-    return sorted_verts
+    pairs, unmatched = loops.match_pairs(len(verts_at_limit), distances, first, second)
+    if unmatched:
+        Logger.warning("Gap vertices without a pair: {}", [verts_at_limit[i] for i in unmatched])
+    return [(verts_at_limit[i], verts_at_limit[j]) for i, j in pairs]
 
 
 def clean_shape_loop(obj):
@@ -867,18 +1202,10 @@ def clean_shape_loop(obj):
 
         Extensive debug messaging added as this is a key moment.
 
-        Input:
-        Output:
+        Input:  mesh object
+        Output: dict with diagnostics - the loop vertex degree histogram, number of
+                gap and shortcut vertices and dissolved edges
     """
-    def calc_distance(origin, vert):
-        """ Calculate Euclidean distance between two points
-
-            Input:  mathutils.Vector
-            Output: float
-        """
-        dx, dy, dz = vert[0] - origin[0], vert[1] - origin[1], vert[2] - origin[2]
-        return math.sqrt((dx * dx) + (dy * dy) + (dz * dz))
-
     bm = bmesh.from_edit_mesh(obj.data)
     bm.verts.ensure_lookup_table()
     faces = [f for f in bm.faces if f.select]
@@ -886,7 +1213,7 @@ def clean_shape_loop(obj):
     # Handle faces - dissolve if any and then loop to see if some are left.
     # If this is true, connect vertices with edges to split the faces
     if faces:
-        Logger.log('Correcting '+str(len(faces)) + ' faces')
+        Logger.info('Correcting {} faces', len(faces))
         bmesh.ops.dissolve_faces(bm, faces=faces)
         faces = [f for f in bm.faces if f.select]
         for face in faces:
@@ -896,154 +1223,140 @@ def clean_shape_loop(obj):
     bm.verts.ensure_lookup_table()
     bm.edges.ensure_lookup_table()
 
-    # Loop over the vertices in the shape loop and count how many edges are
-    # linked to each vertice.
+    # Count how many of the shape loop edges are linked to each vertice, in
+    # one pass over the edges.
     # Based on this count, we will try to find 'holes' in the shape loop.
 
-    indx = 0
-    vertices = [[v, indx] for v in bm.verts if v.select]
+    bm.verts.index_update()
+    vertices = [v for v in bm.verts if v.select]
     edges = [e for e in bm.edges if e.select]
 
-    for v in vertices:
-        for e in edges:
-            if v[0] in e.verts:
-                v[1] += 1
+    degrees = loops.vertex_degrees([[v.index for v in e.verts] for e in edges], len(bm.verts))
+    vertex_degrees = degrees[[v.index for v in vertices]]
+    diagnostics = {'degree_histogram': loops.degree_histogram(vertex_degrees)}
+    Logger.debug('Shape loop vertex degrees: {}', diagnostics['degree_histogram'])
 
     # If there is just one edge connected to a vertice then there is a gap
     # (vers_at_limit). However, if there are more than two, there is a
     # bridge between a tight spot at the shape loop and the edges
     # connecting them will be dissolved.  If there is a single hole,
-    # connect the two vertices, if there are more than two (and even), loop
-    # over the vertices at the holes and look for the min distance. Based
-    # on this connect the vertice pairs.
+    # connect the two vertices, if there are more than two (and even), look
+    # up the nearest vertices at the holes in a k-d tree (pair_gap_vertices)
+    # and connect the closest pairs first, each vertex at most once.
     # NOTE: bmesh.ops.connect_vert_pair sometimes finishes without output
     # results (or error) - this usually happens when the vertices are
     # inside a face (not lying on the borders)
 
-    verts_at_limit = [v[0] for v in vertices if v[1] < 2]
-    verts_at_shortcuts = [v[0] for v in vertices if v[1] > 2]
+    verts_at_limit = [v for v, degree in zip(vertices, vertex_degrees.tolist()) if degree < 2]
+    verts_at_shortcuts = [v for v, degree in zip(vertices, vertex_degrees.tolist()) if degree > 2]
+    diagnostics['gap_vertices'] = len(verts_at_limit)
+    diagnostics['shortcut_vertices'] = len(verts_at_shortcuts)
 
     if verts_at_limit:
-        Logger.log('Number of vertices at shape loop gap: {}'.format(len(verts_at_limit)))
+        Logger.info('Number of vertices at shape loop gap: {}', len(verts_at_limit))
         if len(verts_at_limit) == 1:
-            Logger.log('[Unhandled] Number of vertices at shape loop gap: {}'.format(len(verts_at_limit)))
+            Logger.warning('[Unhandled] Number of vertices at shape loop gap: {}', len(verts_at_limit))
         elif len(verts_at_limit) == 2:
             cEdges = bmesh.ops.connect_vert_pair(bm, verts=verts_at_limit)
             if not cEdges['edges']:
-                Logger.log("Empty result, expecting bad geometry: {}, vertices {}".format(cEdges, verts_at_limit))
+                Logger.warning("Empty result, expecting bad geometry: {}, vertices {}", cEdges, verts_at_limit)
             else:
                 for edge in cEdges['edges']:
                     edge.select = True
             bm.edges.ensure_lookup_table()
         else:
-            pairs = []
-            for v in verts_at_limit:
-                min_dist = [calc_distance(v.co, Vector((0.0, 0.0, 0.0))), v]
-                verts_at_limit_copy = [vd for vd in verts_at_limit if vd != v]
-                for vc in verts_at_limit_copy:
-                    if vc not in [vert for e in v.link_edges for vert in e.verts]:
-                        dist = calc_distance(v.co, vc.co)
-                        if min_dist[0] > dist:
-                            min_dist[0] = dist
-                            min_dist[1] = vc
-                pairs.append((v, min_dist[1]))
+            pairs = pair_gap_vertices(verts_at_limit)
             for pair in pairs:
                 cEdges = bmesh.ops.connect_vert_pair(bm, verts=pair)
                 if not cEdges['edges']:
-                    Logger.log("Empty result, expecting bad geometry: {}, vertices: ".format(cEdges, pair))
+                    Logger.warning("Empty result, expecting bad geometry: {}, vertices: {}", cEdges, pair)
                 else:
                     for edge in cEdges['edges']:
                         edge.select = True
                 bm.edges.ensure_lookup_table()
     if verts_at_shortcuts:
-        Logger.log('Number of vertices at faces/shortcuts: {}'.format(len(verts_at_shortcuts)))
-        edges_at_faces = []
-        for e in edges:
-            if e.verts[0] in verts_at_shortcuts and e.verts[1] in verts_at_shortcuts:
-                edges_at_faces.append(e)
+        Logger.info('Number of vertices at faces/shortcuts: {}', len(verts_at_shortcuts))
+        at_shortcut = set(verts_at_shortcuts)
+        edges_at_faces = [e for e in edges if e.verts[0] in at_shortcut and e.verts[1] in at_shortcut]
+        diagnostics['dissolved_edges'] = len(edges_at_faces)
 
         bmesh.ops.dissolve_edges(bm, edges=edges_at_faces)
 
     bmesh.update_edit_mesh(obj.data)
+    return diagnostics
 
 
-
-def calculate_extrusion(data, curve, seq_type, middle_vertex):
-    """ Calculate the extrusion for each row/column by applying linear interpolation.
-
-        input: dict{},list(),dict[],list(),list()
-        output: dict{sequence: list(BMVerts)}
+def count_loop_diagnostics(diagnostics):
+    """ Add the clean_shape_loop diagnostics to the counters of the active trace:
+        loop_degree_<n> vertices per shape loop degree, gap_vertices,
+        shortcut_vertices and dissolved_edges.
     """
-
-    data_extruded = {}
-    for vertex_index, vertex in data.items():
-        if 'border_vertex' not in vertex.keys():
-            # The curves can be seen as consisting of segments. Between each
-            # segment, there is a cubic bezier fitted. Get the position of the
-            # vertex in this context and calculate the necessary extrusion
-
-            if seq_type == 'column':
-                data_length = vertex['row_columns'][1] - vertex['row_columns'][0]
-                seq_range = 'row_columns'
-            elif seq_type == 'row':
-                data_length = vertex['column_rows'][1] - vertex['column_rows'][0]
-                seq_range = 'column_rows'
-
-            if data_length:
-                segment_length = (data_length - (len(curve._control_set) - 1))/len(curve._control_set)
-                residual = (data_length - (len(curve._control_set) - 1)) % (len(curve._control_set))
-                vertex_position = vertex[seq_type] - vertex[seq_range][0]
-
-                segments = []
-                for segment in range(len(curve._control_set)):
-                    if residual:
-                        # Distribute the residual, by adding an extra row/column
-                        current_segment = math.ceil(segment_length)
-                        residual -= 1
-                        segments.append(current_segment)
-                    else:
-                        current_segment = segment_length
-                        segments.append(current_segment)
-                    if vertex_position <= sum(segments):
-                        # We have found the segment which vertex_position belongs to
-                        # Use this "segment" then
-                        break
-
-                # Cubic beziers are calculated in UV space, where the coordinate system limits are in the range 0-1.
-                # Calculate a step based on this, by doubling the difference between the x - limits.
-                # We have n-columns between start and end of a segment, hence n+1 is the end/start.
-                step = 2 * (curve.control_points_limits[segment][1] - curve.control_points_limits[segment][0])/(current_segment + 1)
-                U = step * (segments[segment] - (sum(segments) - vertex_position))
-                if not vertex_index == middle_vertex['vertex'].index:
-                    control_points = []
-                    if vertex[seq_type] > middle_vertex[seq_type]:
-                        index = middle_vertex[seq_type] - (vertex[seq_type] - middle_vertex[seq_type])
-                    else:
-                        index = middle_vertex[seq_type]
-
-                    for control_point in curve.control_points_y[segment]:
-                        # This forms the extrusion value, based on the distance between the middle and current column/row. Linear interpolation.
-                        control_points.append(index*control_point / middle_vertex[seq_type])
-                    data_extruded[vertex_index] = bezierCurve(control_points, U)
-                else:
-                    data_extruded[vertex_index] = bezierCurve(curve.control_points_y[segment], U)
-            else:
-                # This vertex lying on the border
-                data_extruded[vertex_index] = 0.0
-    return data_extruded
+    for degree, n in diagnostics['degree_histogram'].items():
+        trace.count('loop_degree_{}'.format(degree), n)
+    for name in ('gap_vertices', 'shortcut_vertices', 'dissolved_edges'):
+        trace.count(name, diagnostics.get(name, 0))
 
 
-def bezierCurve(cPoints, u):
-    """ Calculate cubic bezier curve between two points
-        input: control points, vertex_location in the 2D map
-        output: list
-
-    """
-
-    return (cPoints[0]*((1-u)**3) + cPoints[1]*3*u*((1-u)**2) + cPoints[2]*(3*u**2)*(1-u) + cPoints[3]*(u**3))
+MESH_IMPORTERS = {'.stl': lambda path: bpy.ops.import_mesh.stl(filepath=path),
+                  '.obj': lambda path: bpy.ops.import_scene.obj(filepath=path),
+                  '.ply': lambda path: bpy.ops.import_mesh.ply(filepath=path)}
+MESH_EXPORTERS = {'.stl': lambda path: bpy.ops.export_mesh.stl(filepath=path, use_selection=True),
+                  '.obj': lambda path: bpy.ops.export_scene.obj(filepath=path, use_selection=True),
+                  '.ply': lambda path: bpy.ops.export_mesh.ply(filepath=path)}
 
 
+def import_mesh(path):
+    """ Import a mesh file into the scene and return the new object. """
+    unselect_all()
+    MESH_IMPORTERS[os.path.splitext(path)[1].lower()](os.path.abspath(path))
+    return bpy.context.selected_objects[0]
 
 
+def main(argv):
+    """ Command line entry point, for Blender in background mode:
 
+            blender -b socket.blend --python MatrixApproach.py -- --shape ShapeBezierCurve \
+                --curves profile.json --height 2 --output result.blend --trace apply.json
 
+        --mesh imports an .stl/.obj/.ply file as the target instead of the ImportedMesh
+        object. The output is saved as a .blend file, or exported as .stl/.obj/.ply.
+        See shapetool.cli for the options.
+    """
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog='MatrixApproach.py', description="Apply drawn shapes to a socket mesh")
+    parser.add_argument('--mesh', help="mesh file to import as the target")
+    parser.add_argument('--target', help="target object name, ImportedMesh by default")
+    parser.add_argument('--shape', action='append', help="shape curve object name, can be repeated")
+    parser.add_argument('--curves', help="curve profile JSON file, {\"x\": control set, \"y\": control set}")
+    parser.add_argument('--height', type=float, default=core.DEFAULT_HEIGHT, help="height in mm")
+    parser.add_argument('--bmesh', action='store_true', help="apply in a single edit-mesh session")
+    parser.add_argument('--output', help=".blend, .stl, .obj or .ply file")
+    parser.add_argument('--trace', help="write the stage timings as JSON")
+    args = parser.parse_args(argv)
+
+    target = import_mesh(args.mesh).name if args.mesh else args.target
+    curves = {}
+    if args.curves:
+        with open(args.curves) as f:
+            curves = json.load(f)
+
+    export = args.output and os.path.splitext(args.output)[1].lower() in MESH_EXPORTERS
+    job = {'target': target, 'shapes': args.shape or [BL_SHAPE_TOOL_OBJ_NAME], 'curves': curves,
+           'height': args.height, 'use_bmesh': args.bmesh, 'trace': args.trace,
+           'output': None if export else args.output}
+    traces = apply_job(job)
+
+    if export:
+        select_object(target or target_objname)
+        MESH_EXPORTERS[os.path.splitext(args.output)[1].lower()](os.path.abspath(args.output))
+
+    for shape_name, shape_trace in traces.items():
+        print("{}: {:.4f} sec".format(shape_name, shape_trace['duration']))
+        for stage, timing in sorted(shape_trace['stages'].items(), key=lambda item: -item[1]['total']):
+            print("  {:<24} {:.4f} sec ({} calls)".format(stage, timing['total'], timing['calls']))
+
+
+if __name__ == '__main__' and bpy.app.background:
+    main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else [])
@@ -1,8 +1,14 @@
+import array
+import collections
+import hashlib
+import time
+
 import bpy
 import bgl
 import bmesh
 from bpy_extras import view3d_utils
 import mathutils
+import mathutils.bvhtree
 from mathutils import Vector
 
 """Functions for the mouse_coords_to_3D_view"""
@@ -24,53 +30,366 @@ def get_projection_matrix():
     return proj_matrix
 
 
+def view_key(context):
+    """ Identifies the view of a 3D view region: its view matrix, size and position.
+        None outside of a 3D view region.
+    """
+    region = context.region
+    if region is None or context.region_data is None:
+        return None
+    return (tuple(value for row in context.region_data.perspective_matrix for value in row),
+            region.x, region.y, region.width, region.height)
+
+
+class ViewUnprojector(object):
+    """ Unproject window coordinates to world space, from the depth buffer under them.
+
+        The viewport, modelview and projection matrices are read once per view:
+        update(context) re-reads them only when the view of the context changed,
+        and always when the context has no 3D view region.
+        All buffers are allocated once and reused.
+    """
+    MAX_BLOCK = 256 * 256 # largest depth block read with one glReadPixels
+
+    def __init__(self):
+        self.viewport = bgl.Buffer(bgl.GL_INT, 4)
+        self.modelview = bgl.Buffer(bgl.GL_DOUBLE, [4, 4])
+        self.projection = bgl.Buffer(bgl.GL_DOUBLE, [4, 4])
+        self.depth = bgl.Buffer(bgl.GL_FLOAT, [1])
+        self.world = [bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0]) for _ in range(3)]
+        self.view_key = None
+        self.valid = False
+        self.matrix_reads = 0
+
+    def invalidate(self):
+        self.valid = False
+
+    def update(self, context=None):
+        """ Read the view matrices of the current GL context, unless they are cached
+            for the view of the context.
+        """
+        key = view_key(context) if context is not None else None
+        if self.valid and key is not None and key == self.view_key:
+            return
+        bgl.glGetIntegerv(bgl.GL_VIEWPORT, self.viewport)
+        bgl.glGetDoublev(bgl.GL_MODELVIEW_MATRIX, self.modelview)
+        bgl.glGetDoublev(bgl.GL_PROJECTION_MATRIX, self.projection)
+        self.view_key = key
+        self.valid = True
+        self.matrix_reads += 1
+
+    def read_depths(self, coords):
+        """ Depth under each coordinate. Close samples are read as one block. """
+        xs = [x for x, _ in coords]
+        ys = [y for _, y in coords]
+        x0, y0 = min(xs), min(ys)
+        width, height = max(xs) - x0 + 1, max(ys) - y0 + 1
+
+        if len(coords) == 1 or width * height > self.MAX_BLOCK:
+            depths = []
+            for x, y in coords:
+                bgl.glReadPixels(x, y, 1, 1, bgl.GL_DEPTH_COMPONENT, bgl.GL_FLOAT, self.depth)
+                depths.append(self.depth[0])
+            return depths
+
+        block = bgl.Buffer(bgl.GL_FLOAT, [height, width])
+        bgl.glReadPixels(x0, y0, width, height, bgl.GL_DEPTH_COMPONENT, bgl.GL_FLOAT, block)
+        return [block[y - y0][x - x0] for x, y in coords]
+
+    def unproject(self, coords):
+        """ World coordinates of a batch of window coordinates.
+
+            Input:  list of (x, y)
+            Output: list of (x, y, z)
+        """
+        if not self.valid:
+            self.update()
+        coords = [(int(x), int(y)) for x, y in coords]
+        locations = []
+        for (x, y), depth in zip(coords, self.read_depths(coords)):
+            bgl.gluUnProject(x, y, depth, self.modelview, self.projection, self.viewport, *self.world)
+            locations.append(tuple(float(w[0]) for w in self.world))
+        return locations
+
+
+def geometry_key(obj):
+    """ Hash of the mesh vertex coordinates and faces of an object, as
+        MatrixApproach.geometry_key: a preview or displacement moves vertices
+        without changing their number.
+
+        Input:  mesh object
+        Output: str
+    """
+    mesh = obj.data
+    co = array.array('f', bytes(4 * 3 * len(mesh.vertices)))
+    mesh.vertices.foreach_get('co', co)
+    loops = array.array('i', bytes(4 * len(mesh.loops)))
+    mesh.loops.foreach_get('vertex_index', loops)
+    key = hashlib.sha1(co.tobytes())
+    key.update(loops.tobytes())
+    return key.hexdigest()
+
+
+class SurfaceRayCaster(object):
+    """ World coordinates under region coordinates without any GPU readback.
+
+        A ray from the view through each coordinate is cast on the BVH tree of the
+        object; where it misses, the point is taken at the depth of the 3D cursor
+        (view3d_utils.region_2d_to_location_3d). The trees are kept per object
+        until its mesh geometry changes (see geometry_key), or clear() is called.
+    """
+
+    def __init__(self):
+        self.trees = {}
+
+    def tree(self, obj, scene):
+        key = (obj.data.as_pointer(), geometry_key(obj))
+        cached = self.trees.get(obj.name)
+        if cached is None or cached[0] != key:
+            cached = (key, mathutils.bvhtree.BVHTree.FromObject(obj, scene))
+            self.trees[obj.name] = cached
+        return cached[1]
+
+    def clear(self):
+        self.trees.clear()
+
+    def locations(self, context, coords, obj=None):
+        """ Input:  context of a 3D view region, list of region (x, y), mesh object to hit
+            Output: list of (x, y, z)
+        """
+        region, rv3d = context.region, context.region_data
+        if obj is not None:
+            tree = self.tree(obj, context.scene)
+            to_local = obj.matrix_world.inverted()
+
+        locations = []
+        for coord in coords:
+            location = None
+            if obj is not None:
+                origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, coord)
+                direction = view3d_utils.region_2d_to_vector_3d(region, rv3d, coord)
+                hit, _, _, _ = tree.ray_cast(to_local * origin, to_local.to_3x3() * direction)
+                if hit is not None:
+                    location = obj.matrix_world * hit
+            if location is None:
+                location = view3d_utils.region_2d_to_location_3d(region, rv3d, coord, context.scene.cursor_location)
+            locations.append(tuple(location))
+        return locations
+
+
+_unprojector = None
+_ray_caster = None
+
+
+def unprojector():
+    """ The shared ViewUnprojector, created on first use. """
+    global _unprojector
+    if _unprojector is None:
+        _unprojector = ViewUnprojector()
+    return _unprojector
+
+
+def ray_caster():
+    """ The shared SurfaceRayCaster, created on first use. """
+    global _ray_caster
+    if _ray_caster is None:
+        _ray_caster = SurfaceRayCaster()
+    return _ray_caster
+
+
 """Function mouse_coords_to_3D_view"""
 def mouse_coords_to_3D_view(x, y):
-    depth = bgl.Buffer(bgl.GL_FLOAT, [0.0])
-    bgl.glReadPixels(x, y, 1, 1, bgl.GL_DEPTH_COMPONENT, bgl.GL_FLOAT, depth)
-    world_x = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-    world_y = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-    world_z = bgl.Buffer(bgl.GL_DOUBLE, 1, [0.0])
-    view1 = get_viewport()
-    model = get_modelview_matrix()
-    proj = get_projection_matrix ()
-    bgl.gluUnProject(x, y, depth[0],
-                     model, proj,
-                     view1,
-                     world_x, world_y, world_z)
-    return float(world_x[0]), float(world_y[0]), float(world_z[0])
+    return unprojector().unproject([(x, y)])[0]
+
+
+def surface_object(context):
+    """ The mesh the cursor is placed on - the active object, if it is a mesh. """
+    obj = context.active_object
+    return obj if obj is not None and obj.type == 'MESH' else None
+
+
+def region_locations(context, coords):
+    """ World coordinates under region coordinates of the 3D view of the context.
+
+        On a mesh (see surface_object) a ray is cast on its BVH tree, so nothing
+        is read back from the GPU. Without a mesh, the depth buffer is read: this
+        works in the draw callback only, where the view matrices are current.
+
+        Input:  context of a 3D view region, list of region (x, y)
+        Output: list of (x, y, z)
+    """
+    obj = surface_object(context)
+    if obj is not None:
+        return ray_caster().locations(context, coords, obj)
+
+    unprojector().update(context)
+    view = unprojector().viewport
+    return unprojector().unproject([(view[0] + x, view[1] + y) for x, y in coords])
+
+class CursorMarker(object):
+    """ Point marker at the cursor, compiled once into a display list and only
+        translated to the cursor location on every frame.
+    """
+
+    def __init__(self, size=10, color=(0.0, 0.0, 1.0)):
+        self.size = size
+        self.color = color
+        self.display_list = None
+
+    def compile(self):
+        self.display_list = bgl.glGenLists(1)
+        bgl.glNewList(self.display_list, bgl.GL_COMPILE)
+        bgl.glPointSize(self.size)
+        bgl.glColor3f(*self.color)
+        bgl.glBegin(bgl.GL_POINTS)
+        bgl.glVertex3f(0.0, 0.0, 0.0)
+        bgl.glEnd()
+        bgl.glEndList()
+
+    def draw(self, location):
+        if self.display_list is None:
+            self.compile()
+        bgl.glPushMatrix()
+        bgl.glTranslatef(*location)
+        bgl.glCallList(self.display_list)
+        bgl.glPopMatrix()
+
+        # restore opengl defaults
+        bgl.glPointSize(1)
+        bgl.glColor4f(0.0, 0.0, 0.0, 1.0)
+
+
+class FrameStats(object):
+    """ Draw callback times while the modal operator runs. """
+    WINDOW = 120 # frames in the recent mean
+
+    def __init__(self):
+        self.recent = collections.deque(maxlen=self.WINDOW)
+        self.frames = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.recent.append(seconds)
+        self.frames += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+
+    def summary(self):
+        if not self.frames:
+            return "No frames drawn"
+        return "{} frames, {:.2f} ms mean, {:.2f} ms recent, {:.2f} ms max".format(
+            self.frames, 1000 * self.total / self.frames, 1000 * sum(self.recent) / len(self.recent), 1000 * self.worst)
+
+
+CURSOR_MARKER = CursorMarker()
+
 
 """drawing point OpenGL in mouse_coords_to_3D_view"""
 def draw_callback_px(self, context):
-    # mouse coordinates relative to 3d view
-    x, y = self.mouse_path
-    mx, my = self.mx, self.my #got from modal
-
-    # mouse coordinates relative to Blender interface
-    view = get_viewport()
-    gmx = view[0] + x
-    gmy = view[1] + y
-
-    if False:
-        #c= bgl.Buffer(bgl.GL_UNSIGNED_BYTE, [3,1])
-        #bgl.glReadPixels(x, y, 1, 1, bgl.GL_RGB, bgl.GL_FLOAT, c)
-        #c= bgl.Buffer(bgl.GL_SHORT, [3,1])
-        c = bgl.Buffer(bgl.GL_FLOAT, [3,1])
-        bgl.glReadPixels(gmx, gmy,1,1,bgl.GL_RGB,bgl.GL_FLOAT,c);
-        draw_square_follow_cursor(c, gmx, gmy)
-    else:
-        draw_uv_sphere(mx, my, 0.5)
+    start = time.perf_counter()
+
+    # mouse coordinates relative to 3d view, the clicks first
+    coords = list(self.clicks) + ([self.mouse_path] if self.mouse_path else [])
+    locations = region_locations(context, coords) if coords else []
+
+    # clicks off a mesh need the depth buffer; the spheres are added in modal()
+    self.clicked.extend(locations[:len(self.clicks)])
+    self.clicks.clear()
+
+    if self.mouse_path:
+        CURSOR_MARKER.draw(locations[-1])
+
+    self.frame_stats.add(time.perf_counter() - start)
+
+
+class MarkerPool:
+    """ Landmark markers placed on the socket, all sharing one low-poly mesh.
+
+        The markers are objects of the CursorMarkers group, created with the data
+        API, so they can be found without looking through every object. Removed
+        markers are hidden and reused by the next add.
+    """
+    MESH_NAME = 'CursorMarkerMesh'
+    GROUP_NAME = 'CursorMarkers'
+    SUBDIVISIONS = 2
+
+    _free = None # deque of hidden markers to reuse
+
+    @staticmethod
+    def mesh():
+        mesh = bpy.data.meshes.get(MarkerPool.MESH_NAME)
+        if mesh is None:
+            mesh = bpy.data.meshes.new(MarkerPool.MESH_NAME)
+            bm = bmesh.new()
+            bmesh.ops.create_icosphere(bm, subdivisions=MarkerPool.SUBDIVISIONS, diameter=1.0)
+            bm.to_mesh(mesh)
+            bm.free()
+        return mesh
+
+    @staticmethod
+    def group():
+        return bpy.data.groups.get(MarkerPool.GROUP_NAME) or bpy.data.groups.new(MarkerPool.GROUP_NAME)
+
+    @staticmethod
+    def markers():
+        group = bpy.data.groups.get(MarkerPool.GROUP_NAME)
+        return [obj for obj in group.objects if not obj.get('free')] if group else []
+
+    @staticmethod
+    def free():
+        if MarkerPool._free is None:
+            group = bpy.data.groups.get(MarkerPool.GROUP_NAME)
+            MarkerPool._free = collections.deque(obj for obj in group.objects if obj.get('free')) if group \
+                else collections.deque()
+        return MarkerPool._free
+
+    @staticmethod
+    def add(location, size=0.5):
+        """ Show a marker at the location, reusing a removed one when there is one. """
+        obj = None
+        free = MarkerPool.free()
+        while free and obj is None:
+            try:
+                obj = free.pop()
+                obj['free'] = False
+            except ReferenceError:
+                # removed by undo
+                obj = None
+        if obj is None:
+            obj = bpy.data.objects.new('Marker', MarkerPool.mesh())
+            bpy.context.scene.objects.link(obj)
+            MarkerPool.group().objects.link(obj)
+
+        obj.location = location
+        obj.scale = (size, size, size)
+        obj.hide = False
+        return obj
+
+    @staticmethod
+    def remove(obj):
+        obj.hide = True
+        obj['free'] = True
+        MarkerPool.free().append(obj)
+
+    @staticmethod
+    def hide_all(hide=True):
+        """ Hide (or show) all markers, without looking at any other object. """
+        for obj in MarkerPool.markers():
+            obj.hide = hide
+
+    @staticmethod
+    def clear():
+        """ Delete all markers, the shared mesh stays. """
+        group = bpy.data.groups.get(MarkerPool.GROUP_NAME)
+        for obj in list(group.objects) if group else []:
+            bpy.data.objects.remove(obj, do_unlink=True)
+        MarkerPool._free = None
 
 
 def draw_uv_sphere(mx, my, s):
-    print("Draw uv sphere")
-    ob = bpy.data.objects['Cube']
-    v = ob.data.vertices[0].co
-    mat = ob.matrix_world
-    x,y,z = mouse_coords_to_3D_view(mx, my)
-    mv = Vector((x, y, z))
-    print(mv)
-    bpy.ops.mesh.primitive_uv_sphere_add(segments=42, ring_count=42, location=mat * mv, size=s)
+    """ Place a marker of size s on the surface under the window coordinates. """
+    return MarkerPool.add(Vector(mouse_coords_to_3D_view(mx, my)), s)
 
 
 def draw_square_follow_cursor(c, gmx, gmy):
@@ -132,17 +451,34 @@ class ModalDrawOperator(bpy.types.Operator):
     bl_idname = "view3d.modal_operator"
     bl_label = "Simple Modal View3D Operator"
 
-    def modal(self, context, event):
-        context.area.tag_redraw()
+    def add_markers(self):
+        """ One sphere per click, not per frame. """
+        while self.clicked:
+            MarkerPool.add(Vector(self.clicked.popleft()), 0.5)
 
+    def modal(self, context, event):
+        self.add_markers()
+        # redraw only when the cursor moved or a sphere is to be added
         if event.type == 'MOUSEMOVE':
-            self.mouse_path = (event.mouse_region_x, event.mouse_region_y)
-        elif event.type == 'LEFTMOUSE':
-            self.mx, self.my= event.mouse_x, event.mouse_y
+            mouse_path = (event.mouse_region_x, event.mouse_region_y)
+            if mouse_path != self.mouse_path:
+                self.mouse_path = mouse_path
+                context.area.tag_redraw()
+                context.area.header_text_set(self.frame_stats.summary())
+        elif event.type == 'LEFTMOUSE' and event.value == 'PRESS':
+            click = (event.mouse_region_x, event.mouse_region_y)
+            if surface_object(context) is not None:
+                self.clicked.extend(region_locations(context, [click]))
+                self.add_markers()
+            else:
+                # resolved from the depth buffer by the next draw callback
+                self.clicks.append(click)
+            context.area.tag_redraw()
             return {'PASS_THROUGH'}
         elif event.type in {'RIGHTMOUSE', 'ESC'}:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
             context.area.header_text_set()
+            print("Draw callback: " + self.frame_stats.summary())
             return {'CANCELLED'}
 
 
@@ -155,7 +491,12 @@ class ModalDrawOperator(bpy.types.Operator):
         # Add the region OpenGL drawing callback
         # draw in view space with 'POST_VIEW' and 'PRE_VIEW'
         self._handle = bpy.types.SpaceView3D.draw_handler_add(draw_callback_px, args, 'WINDOW', 'POST_VIEW')
-        self.mouse_path = []
+        self.mouse_path = None
+        self.clicks = collections.deque()
+        self.clicked = collections.deque()
+        self.frame_stats = FrameStats()
+        # the mesh may have been edited since the last run
+        ray_caster().clear()
         #self.wx = bpy.context.window.width
         #self.wy = bpy.context.window.height
         context.window_manager.modal_handler_add(self)
@@ -0,0 +1,94 @@
+""" Compare the apply time of the operator path and the single edit-mesh session
+    (MatrixApproach.apply_shape_bmesh) in a headless Blender:
+
+        python benchmarks/bench_apply.py --blender blender --blend socket.blend --repeat 3
+        python benchmarks/bench_apply.py --blend socket.blend --shape ShapeBezierCurve --curves profile.json
+
+    Every apply runs in a fresh Blender process on the unmodified .blend file, with
+    MatrixApproach.py --trace. The best total of each path is printed with its
+    slowest stages, mode changes and edit-mesh write-backs (update_from_editmode).
+
+    The output of a run is kept in the message of the commit that changes either
+    path, so the speedup can be checked against the Blender version it ran on.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLENDER = 'blender'
+REPEAT = 3
+STAGES = 8 # slowest stages printed per path
+PATHS = (('operators', []), ('bmesh', ['--bmesh']))
+
+
+def apply_trace(blender, blend, options):
+    """ Apply the shapes once and read the trace MatrixApproach.py writes.
+
+        Output: dict{shape name: trace as a dict}
+    """
+    fd, trace_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        command = [blender, '-b', blend, '--python-exit-code', '1',
+                   '--python', os.path.join(REPO_DIR, 'MatrixApproach.py'), '--', '--trace', trace_file] + options
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        if process.returncode:
+            raise RuntimeError("Blender exited with {}:\n{}".format(process.returncode, process.stdout[-2000:]))
+        with open(trace_file) as f:
+            return json.load(f)
+    finally:
+        os.remove(trace_file)
+
+
+def best_run(blender, blend, options, repeat):
+    """ The fastest of repeated applies, summed over the shapes.
+
+        Output: dict{'duration', 'stages': {name: seconds}, 'counters': {name: value}}
+    """
+    best = None
+    for _ in range(repeat):
+        traces = apply_trace(blender, blend, options).values()
+        run = {'duration': sum(t['duration'] for t in traces), 'stages': {}, 'counters': {}}
+        for t in traces:
+            for name, stage in t['stages'].items():
+                run['stages'][name] = run['stages'].get(name, 0.0) + stage['total']
+            for name, value in t['counters'].items():
+                run['counters'][name] = run['counters'].get(name, 0) + value
+        if best is None or run['duration'] < best['duration']:
+            best = run
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blender', default=BLENDER)
+    parser.add_argument('--blend', required=True, help=".blend file with the socket and the drawn shape")
+    parser.add_argument('--shape', action='append', help="shape curve object name, can be repeated")
+    parser.add_argument('--curves', help="curve profile JSON file")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args(argv)
+
+    options = [option for shape in args.shape or [] for option in ('--shape', shape)]
+    if args.curves:
+        options += ['--curves', os.path.abspath(args.curves)]
+
+    results = {}
+    for path, path_options in PATHS:
+        run = results[path] = best_run(args.blender, os.path.abspath(args.blend), options + path_options, args.repeat)
+        print("{}: {:.4f} sec, mode_set {}, update_from_editmode {}".format(
+            path, run['duration'], run['counters'].get('mode_set', 0), run['counters'].get('update_from_editmode', 0)))
+        for name, seconds in sorted(run['stages'].items(), key=lambda item: -item[1])[:STAGES]:
+            print("  {:<24} {:.4f} sec".format(name, seconds))
+
+    print("bmesh speedup: {:.2f}x".format(results['operators']['duration'] / results['bmesh']['duration']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
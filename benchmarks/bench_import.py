@@ -0,0 +1,74 @@
+""" Measure the import time of the shape tool modules against a budget.
+
+    Every import runs in a fresh interpreter, so nothing is cached between runs:
+
+        python benchmarks/bench_import.py
+        python benchmarks/bench_import.py --blender blender --budget 0.5
+
+    With --blender, MatrixApproach.py is imported in a headless Blender with the
+    factory startup file - no ImportedMesh or ShapeBezierCurve objects, so the
+    import must not look anything up in the scene. The exit status is 1 when a
+    module goes over the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('shapetool', 'shapetool.core', 'shapetool.curves', 'shapetool.loops', 'shapetool.trace',
+           'shapetool.log', 'shapetool.batch', 'shapetool.cli', 'shapetool.quadrants', 'shapetool.vectors')
+BUDGET = 0.5 # seconds per module
+REPEAT = 3
+
+IMPORT_EXPR = ("import sys, time; sys.path.insert(0, {repo!r}); start = time.perf_counter(); "
+               "import {module}; print('IMPORT_TIME', time.perf_counter() - start)")
+
+
+def import_time(command):
+    """ Run a command printing IMPORT_TIME <seconds> and return the seconds. """
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith('IMPORT_TIME'):
+            return float(line.split()[1])
+    raise RuntimeError("No import time in the output:\n" + output[-2000:])
+
+
+def python_import_time(module):
+    return import_time([sys.executable, '-c', IMPORT_EXPR.format(repo=REPO_DIR, module=module)])
+
+
+def blender_import_time(blender, module='MatrixApproach'):
+    return import_time([blender, '-b', '--factory-startup', '--python-exit-code', '1',
+                        '--python-expr', IMPORT_EXPR.format(repo=REPO_DIR, module=module)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=BUDGET, help="seconds per module")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--blender', help="Blender executable, to import MatrixApproach.py too")
+    args = parser.parse_args(argv)
+
+    timers = [(module, lambda module=module: python_import_time(module)) for module in MODULES]
+    if args.blender:
+        timers.append(('MatrixApproach', lambda: blender_import_time(args.blender)))
+
+    over = []
+    for module, timer in timers:
+        best = min(timer() for _ in range(args.repeat))
+        status = 'ok' if best <= args.budget else 'OVER'
+        print("{:<20} {:.4f} sec  {}".format(module, best, status))
+        if best > args.budget:
+            over.append(module)
+
+    if over:
+        print("Over the {} sec budget: {}".format(args.budget, ", ".join(over)))
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
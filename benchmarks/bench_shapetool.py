@@ -0,0 +1,195 @@
+""" Time the stages of the shaping math on synthetic socket meshes.
+
+    Runs without Blender, on the shapetool core:
+
+        python benchmarks/bench_shapetool.py --output bench_output.json
+        python benchmarks/bench_shapetool.py --scales 1000 10000 --compare bench_output.json
+
+    The results are written as JSON, one entry per (stage, scale, quadrants), so
+    two runs can be compared with --compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shapetool import angular, core, loops
+from shapetool.curves import ControlPoints
+from socket_mesh import socket_mesh, cut_gaps
+
+
+SCALES = (1000, 10000, 100000, 1000000)
+QUADRANTS = (1, 2, 3, 4)
+LOOP_GAPS = 50
+DICT_GRID_MAX = 100000 # largest region the dict-of-dicts grid is built for, to measure its memory
+
+CURVE = [{'end': {'control': {'x': 0.25, 'y': 0.33},
+                  'position': {'x': 0.5, 'y': 0.33}},
+          'start': {'control': {'x': 0, 'y': 0.75},
+                    'position': {'x': 0, 'y': 1}}},
+         {'end': {'control': {'x': 1, 'y': 0.75},
+                  'position': {'x': 1, 'y': 1}},
+          'start': {'control': {'x': 0.75, 'y': 0.33},
+                    'position': {'x': 0.5, 'y': 0.33}}}]
+HEIGHT = 15
+
+
+def timed(func, repeat):
+    """ Run func repeat times, return the last result and the run times in seconds. """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def clean_shape_loop(mesh):
+    """ The loop repair math of clean_shape_loop: vertex degrees and gap pairing. """
+    loop_edges = cut_gaps(mesh.loop_edges, LOOP_GAPS)
+    degrees = loops.vertex_degrees(loop_edges, len(mesh.co))
+    loops.degree_histogram(degrees[mesh.border])
+    at_gap = np.nonzero(mesh.border & (degrees < 2))[0]
+    position = np.full(len(mesh.co), -1)
+    position[at_gap] = np.arange(len(at_gap))
+    joined = position[loop_edges]
+    distances, first, second = loops.gap_candidates(mesh.co[at_gap], joined[(joined >= 0).all(axis=1)])
+    return loops.match_pairs(len(at_gap), distances, first, second)
+
+
+def dict_grid(shape_grid):
+    """ The grid as the dict-of-dicts MatrixApproach.make_grid used to return, without the BMVerts. """
+    grid = {}
+    for vertex in shape_grid:
+        if vertex.border_vertex:
+            grid[vertex.index] = {"column": vertex.column, "row": vertex.row, "border_vertex": True}
+        else:
+            grid[vertex.index] = {"column": vertex.column, "row": vertex.row,
+                                  "column_rows": vertex.column_rows, "row_columns": vertex.row_columns}
+    return grid
+
+
+def allocated(func):
+    """ Bytes still allocated by the result of func, traced with tracemalloc. """
+    tracemalloc.start()
+    try:
+        result = func()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def grid_memory(shape_grid):
+    """ Memory of the array grid, and of the dict-of-dicts grid for regions up to DICT_GRID_MAX vertices.
+
+        Output: dict{'grid_bytes': int, 'dict_grid_bytes': int or None}
+    """
+    memory = {'grid_bytes': shape_grid.nbytes, 'dict_grid_bytes': None}
+    if len(shape_grid) <= DICT_GRID_MAX:
+        memory['dict_grid_bytes'] = allocated(lambda: dict_grid(shape_grid))
+    return memory
+
+
+def bench_mesh(mesh, repeat):
+    """ Time every stage on one mesh.
+
+        Output: dict{stage: list of run times}, dict with the grid memory
+    """
+    stages = {}
+    region_co = mesh.co[mesh.region]
+
+    _, stages['get_shape_limits'] = timed(lambda: angular.angular_order(region_co), repeat)
+    _, stages['create_shape_vertex_map'] = timed(lambda: core.create_shape_vertex_map(0, len(region_co) - 1, region_co),
+                                                 repeat)
+    shape_grid, stages['make_grid'] = timed(lambda: core.make_grid(mesh.co, mesh.region, mesh.border, mesh.edges),
+                                            repeat)
+
+    curve = ControlPoints.cached(CURVE, HEIGHT)
+    inner = ~shape_grid.border
+
+    def calculate_extrusion():
+        core.curve_extrusion(curve, shape_grid.rows[inner], shape_grid.column_rows[inner],
+                             shape_grid.rows[shape_grid.middle_X])
+        core.curve_extrusion(curve, shape_grid.columns[inner], shape_grid.row_columns[inner],
+                             shape_grid.columns[shape_grid.middle_Y])
+
+    _, stages['calculate_extrusion'] = timed(calculate_extrusion, repeat)
+    (indices, values), stages['blend_curves'] = timed(lambda: core.blend_curves(shape_grid, CURVE, CURVE, HEIGHT),
+                                                      repeat)
+    normals = mesh.co / np.linalg.norm(mesh.co, axis=1, keepdims=True)
+    _, stages['displace'] = timed(lambda: core.displace(mesh.co, normals, indices, values), repeat)
+    _, stages['clean_shape_loop'] = timed(lambda: clean_shape_loop(mesh), repeat)
+    return stages, grid_memory(shape_grid)
+
+
+def run(scales, quadrants, repeat):
+    results = []
+    for scale in scales:
+        for quadrant in quadrants:
+            mesh = socket_mesh(scale, quadrant)
+            stages, memory = bench_mesh(mesh, repeat)
+            for stage, times in stages.items():
+                result = {'stage': stage,
+                          'vertices': int(len(mesh.co)),
+                          'scale': scale,
+                          'quadrants': quadrant,
+                          'region_vertices': int(mesh.region.sum()),
+                          'best': min(times),
+                          'mean': sum(times) / len(times)}
+                if stage == 'make_grid':
+                    result.update(memory)
+                results.append(result)
+                print("{:<20} {:>8} verts {} quadrant(s): {:.4f} sec".format(stage, scale, quadrant, min(times)))
+            print("{:<20} {:>8} verts {} quadrant(s): {:.1f} MB arrays, {} dicts".format(
+                'grid_memory', scale, quadrant, memory['grid_bytes'] / 2**20,
+                "{:.1f} MB".format(memory['dict_grid_bytes'] / 2**20) if memory['dict_grid_bytes'] else "-"))
+    return results
+
+
+def compare(results, previous):
+    """ Print the ratio of the best times against a previous run. """
+    before = {(r['stage'], r['scale'], r['quadrants']): r['best'] for r in previous['results']}
+    for r in results:
+        key = (r['stage'], r['scale'], r['quadrants'])
+        if key in before and before[key] > 0:
+            print("{:<20} {:>8} verts {} quadrant(s): {:.2f}x".format(r['stage'], r['scale'], r['quadrants'],
+                                                                       r['best'] / before[key]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--quadrants', type=int, nargs='+', default=QUADRANTS, choices=QUADRANTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help="previous output file to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.quadrants, args.repeat)
+    report = {'meta': {'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'repeat': args.repeat},
+              'results': results}
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
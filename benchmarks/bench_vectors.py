@@ -0,0 +1,95 @@
+""" Time the batched vector math of shapetool.vectors against the per-call helpers
+    it replaced (get_vertex_angle and atan2/sqrt loops over the vertices):
+
+        python benchmarks/bench_vectors.py --sizes 1000 100000
+
+    The results of the old helpers, the batched functions and the scalar
+    wrappers are compared too, the run fails if they differ.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shapetool import vectors
+
+
+SIZES = (1000, 10000, 100000)
+REPEAT = 3
+
+
+def get_vertex_angle(vtx1=(), vtx2=()):
+    """ The get_vertex_angle of get_shape_limits.py before shapetool.vectors. """
+    def __dot(v1=(), v2=()):
+        return (v1[0] * v2[0]) + (v1[1] * v2[1])
+
+    def __len(v1=()):
+        return math.sqrt((v1[0] ** 2) + (v1[1] ** 2))
+
+    def __norm(v1=()):
+        return (v1[0] / __len(v1), v1[1] / __len(v1))
+
+    return math.acos(__dot(__norm(vtx1), __norm(vtx2))) * 180 / math.pi
+
+
+def loop_angles(v1, v2):
+    return [get_vertex_angle(a, b) for a, b in zip(v1, v2)]
+
+
+def loop_polar(xy):
+    return [(math.sqrt(x ** 2 + y ** 2), math.degrees(math.atan2(y, x))) for x, y in xy]
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def bench(size, repeat):
+    """ Output: dict{name: (per-call seconds, batched seconds)} """
+    rng = np.random.default_rng(size)
+    v1, v2 = rng.uniform(-1, 1, (size, 2)), rng.uniform(-1, 1, (size, 2))
+    l1, l2 = v1.tolist(), v2.tolist()
+
+    results = {}
+    expected, per_call = timed(lambda: loop_angles(l1, l2), repeat)
+    actual, batched = timed(lambda: vectors.angles(v1, v2), repeat)
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+    results['angles'] = per_call, batched
+
+    actual, scalar = timed(lambda: [vectors.angle(a, b) for a, b in zip(l1, l2)], repeat)
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+    results['angle (scalar)'] = per_call, scalar
+
+    expected, per_call = timed(lambda: loop_polar(l1), repeat)
+    (radius, theta), batched = timed(lambda: vectors.to_polar(v1), repeat)
+    np.testing.assert_allclose(np.c_[radius, theta], expected, atol=1e-9)
+    results['to_polar'] = per_call, batched
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        for name, (per_call, batched) in bench(size, args.repeat).items():
+            print("{:<16} {:>8} vectors: per call {:.4f} sec, vectors {:.4f} sec, {:.1f}x".format(
+                name, size, per_call, batched, per_call / batched))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+""" Synthetic socket meshes for the benchmarks.
+
+    A socket is a cylinder (or cone) around the Z axis, sampled as a grid of
+    rings. The drawn shape is an ellipse in (angle, height) on its surface, the
+    number of quadrants it covers is chosen by the shape span.
+"""
+
+import numpy as np
+
+
+# (center, span) of the shape in degrees, per number of covered quadrants
+SHAPE_SPANS = {1: (45.0, 60.0),
+               2: (90.0, 150.0),
+               3: (135.0, 240.0),
+               4: (300.0, 300.0)}  # crosses the 0/360 direction
+
+
+class SocketMesh(object):
+    """ Mesh arrays of a synthetic socket with a drawn shape. """
+
+    def __init__(self, co, edges, region, border, loop_edges):
+        self.co = co
+        self.edges = edges
+        self.region = region
+        self.border = border
+        self.loop_edges = loop_edges
+
+
+def socket_mesh(vertices, quadrants=1, cone=0.3):
+    """ Create a socket of about the given number of vertices with a shape in 1-4 quadrants.
+
+        Input:  number of vertices, number of quadrants, radius reduction of the cone top
+        Output: SocketMesh
+    """
+
+    rings = max(8, int(round(np.sqrt(vertices * 2))))
+    levels = max(3, int(round(vertices / rings)))
+
+    angle = np.radians(np.arange(rings) * 360.0 / rings)
+    z = np.linspace(0.0, 1.0, levels)
+    A, Z = np.meshgrid(angle, z, indexing='ij')
+    radius = 0.5 * (1 - cone * Z)
+    co = np.stack((radius * np.cos(A), radius * np.sin(A), Z), axis=2).reshape(-1, 3)
+
+    grid = np.arange(rings * levels).reshape(rings, levels)
+    around = np.stack((grid.reshape(-1), np.roll(grid, -1, axis=0).reshape(-1)), axis=1)
+    up = np.stack((grid[:, :-1].reshape(-1), grid[:, 1:].reshape(-1)), axis=1)
+    edges = np.concatenate((around, up))
+
+    center, span = SHAPE_SPANS[quadrants]
+    delta = (np.degrees(A) - center + 180.0) % 360.0 - 180.0
+    inside = (delta / (span / 2)) ** 2 + ((Z - 0.5) / 0.4) ** 2 <= 1.0
+
+    outside_neighbour = np.zeros_like(inside)
+    outside_neighbour |= ~np.roll(inside, 1, axis=0) | ~np.roll(inside, -1, axis=0)
+    outside_neighbour[:, 1:] |= ~inside[:, :-1]
+    outside_neighbour[:, :-1] |= ~inside[:, 1:]
+    border = (inside & outside_neighbour).reshape(-1)
+    region = inside.reshape(-1)
+
+    loop_edges = edges[border[edges].all(axis=1)]
+    return SocketMesh(co, edges, region, border, loop_edges)
+
+
+def cut_gaps(loop_edges, gaps):
+    """ Remove evenly spread edges from the shape loop, leaving 2 * gaps vertices at the gaps. """
+    keep = np.ones(len(loop_edges), dtype=bool)
+    keep[np.linspace(0, len(loop_edges) - 1, gaps).astype(np.int64)] = False
+    return loop_edges[keep]
@@ -0,0 +1,6 @@
+""" Geometry kernels of the shape tool.
+
+    The modules in this package work on plain NumPy arrays (vertex coordinates,
+    edge index pairs, boundary masks) and never import bpy, so they can be
+    used both from the Blender scripts and outside of the Blender process.
+"""
@@ -0,0 +1,64 @@
+import numpy as np
+
+from shapetool import vectors
+
+
+GAP_THRESHOLD = 2.0  # degrees between two neighbour vertices to consider it a gap
+
+
+def vertex_angles(xy):
+    """ Angle of every point against the (0, 0) origin in the XY plane.
+
+        Input:  float array (N x 2) or (N x 3)
+        Output: float array (N), degrees in the range [0, 360)
+    """
+
+    angles = vectors.polar_angles(xy)
+    angles[angles < 0] += 360.0  # fix for negative degrees
+    return angles
+
+
+def largest_gap(sorted_angles):
+    """ Find the largest angular gap between two neighbour vertices.
+
+        The gap between the last and the first vertex (across 360 degrees) is
+        included, it is reported with index len - 1.
+
+        Input:  float array (N), sorted ascending
+        Output: index of the vertex before the gap, gap size in degrees
+    """
+
+    if len(sorted_angles) < 2:
+        return len(sorted_angles) - 1, 360.0
+
+    gaps = np.empty(len(sorted_angles))
+    gaps[:-1] = np.diff(sorted_angles)
+    gaps[-1] = sorted_angles[0] + 360.0 - sorted_angles[-1]
+    i = int(np.argmax(gaps))
+    return i, float(gaps[i])
+
+
+def angular_order(xy, gap_threshold=GAP_THRESHOLD):
+    """ Order the shape vertices by their angle around the origin, from the shape "beginning" to its "end".
+
+        The vertices are sorted by angle. If the largest gap between two neighbour
+        vertices is inside the sorted range and larger than gap_threshold, the shape
+        crosses the 0/360 degrees direction: the order starts from the vertex before
+        the gap and goes backwards, wrapping over the end of the array, to the vertex
+        after the gap. Otherwise the sorted order is already continuous. This works
+        for shapes in any number of quadrants.
+
+        Input:  float array (N x 2) or (N x 3), gap threshold in degrees
+        Output: int array (N) with the point indices in shape order
+    """
+
+    angles = vertex_angles(xy)
+    order = np.argsort(angles, kind='stable')
+    if len(order) < 2:
+        return order
+
+    i, gap = largest_gap(angles[order])
+    if i == len(order) - 1 or gap <= gap_threshold:
+        return order
+
+    return np.roll(order[::-1], i + 1 - len(order))
@@ -0,0 +1,210 @@
+""" Apply many shapes to many sockets in parallel.
+
+    A manifest lists the jobs, each one socket with one or more drawn shapes:
+
+        {"jobs": [{"mesh": "sockets/0001.blend",
+                   "shapes": ["ShapeBezierCurve", "ReliefZone.001"],
+                   "curves": "profiles/relief.json",
+                   "height": 2,
+                   "output": "out/0001.blend"},
+                  {"mesh": "sockets/0002.npz",
+                   "shapes": ["relief"],
+                   "curves": {"x": [...], "y": [...]},
+                   "height": 2}]}
+
+    curves is a curve profile JSON file or the profile itself, {"x": control
+    set, "y": control set}. height is in mm, core.DEFAULT_HEIGHT if not given.
+    Paths are relative to the manifest.
+
+    .blend jobs run in a headless Blender (MatrixApproach.apply_job). Other meshes
+    are .npz files run on the bpy-free core: arrays 'co', 'edges', optionally
+    'normals', and '<shape>_region' and '<shape>_border' masks per shape. The
+    output .npz holds the extrusion field of every shape, '<shape>_indices' and
+    '<shape>_values', and the displaced 'co' when the normals are given.
+
+    Every job runs in its own worker process and Blender jobs in their own Blender
+    process, so one failing job does not stop the others:
+
+        python -m shapetool.batch manifest.json --workers 8 --report batch_report.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from shapetool import core, trace
+
+
+BLENDER = 'blender'
+TIMEOUT = 600 # seconds per Blender job
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLENDER_EXPR = ("import sys, json; sys.path.insert(0, {repo!r}); import MatrixApproach; "
+                "MatrixApproach.apply_job(json.loads({job!r}))")
+
+
+def load_manifest(path):
+    """ Read the jobs of a manifest, with the paths resolved and the curve profiles loaded.
+
+        Output: list of job dicts
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for i, job in enumerate(manifest['jobs']):
+        job = dict(job)
+        job.setdefault('id', i)
+        job['mesh'] = os.path.join(base, job['mesh'])
+        if job.get('output'):
+            job['output'] = os.path.join(base, job['output'])
+        if isinstance(job.get('curves'), str):
+            with open(os.path.join(base, job['curves'])) as f:
+                job['curves'] = json.load(f)
+        jobs.append(job)
+    return jobs
+
+
+def run_core_job(job):
+    """ Run the shapes of a job on the core, from the mesh arrays in an .npz file.
+
+        Output: dict{shape: Tracer}
+    """
+    data = np.load(job['mesh'])
+    co, edges = data['co'], data['edges']
+    curves = job.get('curves') or {}
+
+    tracers = {}
+    result = {}
+    for shape in job['shapes']:
+        tracer = trace.start(shape)
+        try:
+            indices, values = core.extrusion_field(co, data[shape + '_region'], data[shape + '_border'], edges,
+                                                   curves.get('x'), curves.get('y'), job.get('height', core.DEFAULT_HEIGHT))
+            if 'normals' in data:
+                with trace.span('displace'):
+                    co = core.displace(co, data['normals'], indices, values)
+        finally:
+            trace.stop()
+        result[shape + '_indices'] = indices
+        result[shape + '_values'] = values
+        tracers[shape] = tracer
+
+    if job.get('output'):
+        if 'normals' in data:
+            result['co'] = co
+        np.savez(job['output'], **result)
+    return tracers
+
+
+def run_blender_job(job, blender=BLENDER, timeout=TIMEOUT):
+    """ Run the shapes of a job in a headless Blender on the .blend file.
+
+        Output: dict{shape: stage timings}
+    """
+    fd, trace_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        job = dict(job, trace=trace_file)
+        command = [blender, '-b', job['mesh'], '--python-exit-code', '1',
+                   '--python-expr', BLENDER_EXPR.format(repo=REPO_DIR, job=json.dumps(job))]
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 universal_newlines=True, timeout=timeout)
+        if process.returncode:
+            raise RuntimeError("Blender exited with {}:\n{}".format(process.returncode, process.stdout[-2000:]))
+        with open(trace_file) as f:
+            traces = json.load(f)
+    finally:
+        os.remove(trace_file)
+    return {shape: tracer['stages'] for shape, tracer in traces.items()}
+
+
+def run_job(job, blender=BLENDER, timeout=TIMEOUT):
+    """ Run one job and report its outcome, never raising.
+
+        Output: dict with the job id, mesh, status ('ok' or 'failed'), wall time,
+                stage timings per shape and the error of a failed job
+    """
+    start = time.perf_counter()
+    report = {'id': job['id'], 'mesh': job['mesh'], 'shapes': len(job['shapes'])}
+    try:
+        if job['mesh'].endswith('.blend'):
+            report['stages'] = run_blender_job(job, blender, timeout)
+        else:
+            report['stages'] = {shape: tracer.stages() for shape, tracer in run_core_job(job).items()}
+        report['status'] = 'ok'
+    except Exception:
+        report['status'] = 'failed'
+        report['error'] = traceback.format_exc()
+    report['time'] = time.perf_counter() - start
+    return report
+
+
+def run(jobs, workers=None, blender=BLENDER, timeout=TIMEOUT):
+    """ Run the jobs on a process pool.
+
+        Output: list of job reports, in manifest order
+    """
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job, blender, timeout): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                report = future.result()
+            except Exception:
+                # the worker process itself died
+                report = {'id': job['id'], 'mesh': job['mesh'], 'shapes': len(job['shapes']),
+                          'status': 'failed', 'error': traceback.format_exc(), 'time': 0.0}
+            reports.append(report)
+            print("{:<6} {:>8.3f} sec  {}".format(report['status'], report['time'], report['mesh']))
+    return sorted(reports, key=lambda report: report['id'])
+
+
+def summary(reports, wall_time):
+    """ Totals of a batch run.
+
+        Output: dict
+    """
+    times = sorted(report['time'] for report in reports if report['status'] == 'ok')
+    return {'jobs': len(reports),
+            'ok': len(times),
+            'failed': len(reports) - len(times),
+            'shapes': sum(report['shapes'] for report in reports if report['status'] == 'ok'),
+            'wall_time': wall_time,
+            'job_time_total': sum(times),
+            'job_time_median': times[len(times) // 2] if times else None,
+            'job_time_max': times[-1] if times else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, the CPU count by default")
+    parser.add_argument('--blender', default=BLENDER, help="Blender executable for .blend jobs")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help="seconds per Blender job")
+    parser.add_argument('--report', default='batch_report.json')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    reports = run(load_manifest(args.manifest), args.workers, args.blender, args.timeout)
+    totals = summary(reports, time.perf_counter() - start)
+
+    with open(args.report, 'w') as f:
+        json.dump({'summary': totals, 'jobs': reports}, f, indent=2)
+
+    print("{ok}/{jobs} jobs ok, {failed} failed, {shapes} shapes in {wall_time:.2f} sec".format(**totals))
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
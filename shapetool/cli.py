@@ -0,0 +1,85 @@
+""" Apply shapes to a socket mesh from the command line, on the bpy-free core.
+
+        python -m shapetool.cli socket.npz --shape relief --curves profile.json --height 2 \\
+            --output result.npz --trace apply.trace
+
+    The mesh and output are .npz files as described in shapetool.batch. The stage
+    timings of every shape are printed; --trace exports them (Chrome trace format
+    if the name ends with '.trace', JSON otherwise) and --profile writes cProfile
+    statistics. With --repeat the shapes are applied several times, for timing.
+
+    In Blender, the same options run MatrixApproach.py on a .blend file:
+
+        blender -b socket.blend --python MatrixApproach.py -- --shape ShapeBezierCurve \\
+            --curves profile.json --output result.blend
+"""
+
+import argparse
+import cProfile
+import json
+import sys
+
+from shapetool import batch, core
+
+
+def load_curves(path):
+    """ Read a curve profile JSON file, {"x": control set, "y": control set}. """
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_stages(name, tracer):
+    print(tracer.summary().replace(tracer.name, name, 1))
+
+
+def write_traces(path, tracers):
+    """ Export the traces of all shapes to one file. """
+    if path.endswith('.trace'):
+        events = []
+        for tracer in tracers:
+            events += tracer.to_chrome_trace()['traceEvents']
+        data = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    else:
+        data = [tracer.to_dict() for tracer in tracers]
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mesh', help=".npz mesh arrays")
+    parser.add_argument('--shape', action='append', required=True, help="shape name, can be repeated")
+    parser.add_argument('--curves', help="curve profile JSON file")
+    parser.add_argument('--height', type=float, default=core.DEFAULT_HEIGHT, help="height in mm")
+    parser.add_argument('--output', help=".npz file for the extrusion field")
+    parser.add_argument('--trace', help="export the stage timings")
+    parser.add_argument('--profile', help="write cProfile statistics")
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    job = {'id': 0, 'mesh': args.mesh, 'shapes': args.shape, 'curves': load_curves(args.curves),
+           'height': args.height, 'output': args.output}
+
+    profile = cProfile.Profile() if args.profile else None
+    tracers = []
+    for run in range(args.repeat):
+        if profile:
+            profile.enable()
+        results = batch.run_core_job(job)
+        if profile:
+            profile.disable()
+        for shape, tracer in results.items():
+            print_stages("{} (run {})".format(shape, run + 1) if args.repeat > 1 else shape, tracer)
+            tracers.append(tracer)
+
+    if args.trace:
+        write_traces(args.trace, tracers)
+    if profile:
+        profile.dump_stats(args.profile)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+""" The shaping math of MatrixApproach.py on plain arrays, without bpy.
+
+    The mesh is passed as vertex coordinates (N x 3), edges (E x 2 vertex
+    indices) and masks of the shape region (the 'modifier_group') and of the
+    shape loop (the 'shape_intersection_group'). The result is the extrusion of
+    the region vertices along their normals.
+"""
+
+import numpy as np
+
+from shapetool import angular, extrusion, grid, quadrants, trace
+from shapetool.curves import ControlPoints
+
+
+DEFAULT_HEIGHT = 2 # mm, wherever no height is given
+
+
+class ShapeGrid(object):
+    """ 2D map of the shape region, where each vertex has a unique column and row.
+
+        All arrays are indexed by the position of the vertex in the region, index
+        holds the mesh vertex index of each position. Columns, rows and the
+        boundary brackets are int32, border is a bool mask. An empty region gives
+        an empty grid, with middle_X and middle_Y -1.
+    """
+
+    def __init__(self, index, border, columns, rows, column_rows, row_columns, middle_X, middle_Y):
+        self.index = np.asarray(index, dtype=np.int32)
+        self.border = np.asarray(border, dtype=bool)
+        self.columns = np.asarray(columns, dtype=np.int32)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.column_rows = np.asarray(column_rows, dtype=np.int32)
+        self.row_columns = np.asarray(row_columns, dtype=np.int32)
+        self.middle_X = int(middle_X)
+        self.middle_Y = int(middle_Y)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return (GridVertex(self, local) for local in range(len(self)))
+
+    def vertex(self, local):
+        """ The vertex at a position in the region. """
+        return GridVertex(self, local)
+
+    @property
+    def nbytes(self):
+        """ Memory of the grid arrays in bytes. """
+        return sum(array.nbytes for array in (self.index, self.border, self.columns, self.rows,
+                                               self.column_rows, self.row_columns))
+
+
+class GridVertex(object):
+    """ View of one vertex of a ShapeGrid, reading from the grid arrays.
+
+        column_rows and row_columns, the rows/columns bounding an inner vertex, are
+        None for the border vertices.
+    """
+    __slots__ = ('grid', 'local')
+
+    def __init__(self, grid, local):
+        self.grid = grid
+        self.local = local
+
+    @property
+    def index(self):
+        return int(self.grid.index[self.local])
+
+    @property
+    def column(self):
+        return int(self.grid.columns[self.local])
+
+    @property
+    def row(self):
+        return int(self.grid.rows[self.local])
+
+    @property
+    def border_vertex(self):
+        return bool(self.grid.border[self.local])
+
+    @property
+    def column_rows(self):
+        return None if self.border_vertex else tuple(self.grid.column_rows[self.local].tolist())
+
+    @property
+    def row_columns(self):
+        return None if self.border_vertex else tuple(self.grid.row_columns[self.local].tolist())
+
+    def __repr__(self):
+        return "GridVertex(index={}, column={}, row={}, border_vertex={})".format(self.index, self.column, self.row,
+                                                                                 self.border_vertex)
+
+
+def shape_loop_edges(edges, border):
+    """ The edges with both vertices on the shape loop.
+
+        Input:  int array (E x 2), bool array (N) over the mesh vertices
+        Output: int array (L x 2)
+    """
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    return edges[np.asarray(border, dtype=bool)[edges].all(axis=1)]
+
+
+def make_grid(co, region, border, edges, gap_threshold=angular.GAP_THRESHOLD):
+    """ Create the 2D map of the shape region vertices.
+
+        Columns follow the angular order of the vertices around the origin, rows
+        the z-coordinate. The shape loop adds the boundaries of every inner vertex.
+
+        Input:  float array (N x 3), bool array (N) shape region, bool array (N)
+                shape loop, int array (E x 2) mesh edges, gap threshold in degrees
+        Output: ShapeGrid
+    """
+
+    co = np.asarray(co, dtype=np.float64).reshape(-1, 3)
+    border = np.asarray(border, dtype=bool)
+    index = np.nonzero(region)[0]
+
+    local_index = np.full(len(co), -1, dtype=np.int64)
+    local_index[index] = np.arange(len(index))
+    loop_edges = local_index[shape_loop_edges(edges, border & np.asarray(region, dtype=bool))]
+
+    column_order = angular.angular_order(co[index], gap_threshold)
+    region_border = border[index]
+    columns, rows, column_rows, row_columns, middle_X, middle_Y = grid.build_grid(column_order, co[index, 2],
+                                                                                  region_border, loop_edges)
+    return ShapeGrid(index, region_border, columns, rows, column_rows, row_columns, middle_X, middle_Y)
+
+
+def blend_curves(shape_grid, curveXdata, curveYdata, height, weight_x=0.5):
+    """ Blend the user defined (X,Y) curves into one extrusion value per vertex.
+
+        Without curves, the whole region is extruded by the height. Otherwise the
+        inner vertices get the weighted average of the row (X curve) and column
+        (Y curve) extrusion, the middle vertex of the rows keeps its row value.
+
+        Input:  ShapeGrid, curve control sets, height in mm, weight of the X curve
+        Output: int array (M) mesh vertex indices, float array (M) extrude values
+    """
+
+    if not len(shape_grid):
+        return shape_grid.index, np.empty(0)
+    if not (curveXdata and curveYdata):
+        return shape_grid.index, np.full(len(shape_grid), height / 1000)
+
+    curveX = ControlPoints.cached(curveXdata, height)
+    curveY = ControlPoints.cached(curveYdata, height)
+    inner = np.nonzero(~shape_grid.border)[0]
+
+    column_values = curve_extrusion(curveX, shape_grid.rows[inner], shape_grid.column_rows[inner],
+                                    shape_grid.rows[shape_grid.middle_X])
+    row_values = curve_extrusion(curveY, shape_grid.columns[inner], shape_grid.row_columns[inner],
+                                 shape_grid.columns[shape_grid.middle_Y])
+
+    values = blend_profiles(column_values, row_values, weight_x)
+    values[inner == shape_grid.middle_X] = column_values[inner == shape_grid.middle_X]
+    return shape_grid.index[inner], values / 1000
+
+
+def blend_profiles(column_values, row_values, weight_x=0.5):
+    """ Weighted average of the X and Y curve extrusion of the same vertices.
+
+        Input:  float arrays (M), weight of the X curve (column values) in [0, 1]
+        Output: float array (M)
+    """
+
+    return weight_x * np.asarray(column_values) + (1 - weight_x) * np.asarray(row_values)
+
+
+def displace(co, normals, indices, values):
+    """ Move vertices along their normals by the extrude values.
+
+        Input:  float arrays (N x 3) coordinates and normals, int array (M) vertex
+                indices, float array (M) extrude values
+        Output: float array (N x 3), a displaced copy of co
+    """
+
+    co = np.array(co, copy=True).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int64)
+    normals = np.asarray(normals).reshape(-1, 3)
+    co[indices] += normals[indices] * np.asarray(values, dtype=co.dtype)[:, None]
+    return co
+
+
+def curve_extrusion(curve, ranks, brackets, middle_rank):
+    """ Extrusion of the vertices along their rows or columns by one curve.
+
+        Input:  ControlPoints, int array (M) rows/columns, int array (M x 2)
+                boundary rows/columns, middle row/column
+        Output: float array (M)
+    """
+
+    segments = range(len(curve._control_set))
+    return extrusion.extrude(ranks, brackets, middle_rank,
+                             [curve.control_points_y[segment] for segment in segments],
+                             [curve.control_points_limits[segment] for segment in segments],
+                             curve.evaluate)
+
+
+def extrusion_field(co, region, border, edges, curveXdata, curveYdata, height, gap_threshold=angular.GAP_THRESHOLD,
+                    weight_x=0.5):
+    """ Run the shaping math from the mesh arrays to the extrusion of each vertex.
+
+        Input:  see make_grid and blend_curves
+        Output: int array (M) mesh vertex indices, float array (M) extrude values
+    """
+
+    with trace.span('make_grid'):
+        shape_grid = make_grid(co, region, border, edges, gap_threshold)
+    with trace.span('blend_curves'):
+        return blend_curves(shape_grid, curveXdata, curveYdata, height, weight_x)
+
+
+def create_shape_vertex_map(shape_min, shape_max, co):
+    """ Create an initial vertices map of the shape, taking into account
+        the shape limits (shape_min, shape_max). Can handle up to three quadrants.
+
+        Input:  vertex index of the shape min and max, float array (N x 3)
+        Output: list of vertex index lists, one per quadrant
+    """
+
+    quadrant_map = quadrants.QuadrantMap(np.asarray(co, dtype=np.float64).reshape(-1, 3))
+    shape_coverage = quadrant_map.coverage()
+    initial_vert_map = {quadrant: quadrant_map.indices(quadrant, descending=quadrant in ('Q1', 'Q2')).tolist()
+                        for quadrant in shape_coverage}
+
+    sorted_initial_vert_map = []
+    visited = []
+    for limit in [shape_min, shape_max]:
+        code = quadrant_map.codes[limit]
+        if code:
+            sorted_initial_vert_map.append(initial_vert_map[quadrants.QUADRANTS[code - 1]])
+            visited.append(quadrants.QUADRANTS[code - 1])
+
+    for quadrant in shape_coverage:
+        if quadrant not in visited:
+            sorted_initial_vert_map.insert(1, initial_vert_map[quadrant])
+
+    return sorted_initial_vert_map
@@ -0,0 +1,150 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from shapetool import extrusion
+
+
+LUT_RESOLUTION = 1024  # samples per bezier segment
+CACHE_SIZE = 16  # curve profiles kept between applies
+
+
+class BezierLUT(object):
+    """ Dense lookup table of the cubic bezier segments of a curve.
+
+        Each segment is sampled over the curve parameter range the extrusion can
+        reach, [0, 2 * (x-limit difference)], and linearly interpolated between the
+        samples. Parameters outside of the table are evaluated exactly.
+    """
+
+    def __init__(self, control_points, limits, resolution=LUT_RESOLUTION):
+        self.control_points = np.asarray(control_points, dtype=np.float64).reshape(-1, 4)
+        self.u_max = 2 * (np.asarray(limits, dtype=np.float64).reshape(-1, 2) @ (-1.0, 1.0))
+        self.resolution = resolution
+
+        samples = np.linspace(0.0, 1.0, resolution)[None, :] * self.u_max[:, None]
+        basis = extrusion.bernstein_basis(samples.reshape(-1)).reshape(len(self.u_max), resolution, 4)
+        self.table = np.einsum('kij,kj->ki', basis, self.control_points)
+
+    def evaluate(self, segment, u, exact=False):
+        """ Look up the bezier value of each (segment, u) pair.
+
+            Input:  int array (M), float array (M), evaluate without the table
+            Output: float array (M)
+        """
+
+        segment = np.asarray(segment, dtype=np.int64)
+        u = np.asarray(u, dtype=np.float64)
+        if exact:
+            return self._exact(segment, u)
+
+        u_max = self.u_max[segment]
+        in_table = (u >= 0) & (u <= u_max) & (u_max > 0)
+
+        values = np.empty(len(u))
+        position = u[in_table] / u_max[in_table] * (self.resolution - 1)
+        low = np.minimum(position.astype(np.int64), self.resolution - 2)
+        fraction = position - low
+        rows = self.table[segment[in_table]]
+        values[in_table] = rows[np.arange(len(low)), low] * (1 - fraction) + rows[np.arange(len(low)), low + 1] * fraction
+
+        outside = ~in_table
+        values[outside] = self._exact(segment[outside], u[outside])
+        return values
+
+    def error_bound(self):
+        """ Largest difference between the table and the exact bezier of each segment.
+
+            The linear interpolation error is at most h^2 / 8 * max|B''| over the
+            sample spacing h. B'' of a cubic is linear in u, so its largest
+            magnitude is at one of the table ends.
+
+            Output: float array (K)
+        """
+
+        p = self.control_points
+        second = 6 * np.stack((p[:, 0] - 2 * p[:, 1] + p[:, 2],
+                               (1 - self.u_max) * (p[:, 0] - 2 * p[:, 1] + p[:, 2]) +
+                               self.u_max * (p[:, 1] - 2 * p[:, 2] + p[:, 3])), axis=1)
+        h = self.u_max / (self.resolution - 1)
+        return h ** 2 / 8 * np.abs(second).max(axis=1)
+
+    def _exact(self, segment, u):
+        return np.einsum('ij,ij->i', extrusion.bernstein_basis(u), self.control_points[segment])
+
+
+class ControlPoints():
+
+    _cache = OrderedDict()
+
+    def __init__(self, control_set, height):
+        self._control_set = control_set
+        self.height = height
+        self.curve_max = self.find_max()
+        self.control_points_x = self.get_control_points_X()
+        self.control_points_y = self.get_control_points_Y()
+        self.control_points_limits = self.get_control_points_limits()
+        self.lut = BezierLUT([self.control_points_y[indx] for indx in range(len(control_set))],
+                             [self.control_points_limits[indx] for indx in range(len(control_set))])
+
+    def find_max(self):
+        curve_data = []
+        for curve in self._control_set:
+            curve_data.append(1 - curve["start"]["position"]["y"])
+            curve_data.append(1 - curve["end"]["position"]["y"])
+            curve_data.append(1 - curve["start"]["control"]["y"])
+            curve_data.append(1 - curve["end"]["control"]["y"])
+        return max(curve_data)
+
+    def get_control_points_Y(self):
+        control_points = {}
+        for indx, segment in enumerate(self._control_set):
+            control_points[indx] = [((1 - segment["start"]["position"]["y"])/self.curve_max)*self.height]
+            control_points[indx].append(((1 - segment["start"]["control"]["y"])/self.curve_max)*self.height)
+            control_points[indx].append(((1 - segment["end"]["control"]["y"])/self.curve_max)*self.height)
+            control_points[indx].append(((1 - segment["end"]["position"]["y"])/self.curve_max)*self.height)
+        return control_points
+
+    def get_control_points_X(self):
+        control_points = {}
+        for indx, segment in enumerate(self._control_set):
+            control_points[indx] = [segment["start"]["position"]["x"]]
+            control_points[indx].append(segment["start"]["control"]["x"])
+            control_points[indx].append(segment["end"]["control"]["x"])
+            control_points[indx].append(segment["end"]["position"]["x"])
+        return control_points
+
+    def get_control_points_limits(self):
+        limits = {}
+        for indx, segment in enumerate(self._control_set):
+            limits[indx] = [min(self.control_points_x[indx])]
+            limits[indx].append(max(self.control_points_x[indx]))
+        return limits
+
+    def evaluate(self, segment, u, exact=False):
+        """ Bezier value of the curve for each (segment, u) pair, from the lookup table unless exact. """
+        return self.lut.evaluate(segment, u, exact)
+
+    @staticmethod
+    def cache_key(control_set, height):
+        return hashlib.sha1(json.dumps([control_set, height], sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def cached(cls, control_set, height):
+        """ Return the control points of a curve, reusing them while the curve and height don't change.
+
+            The least recently used curves are dropped when more than CACHE_SIZE are kept.
+        """
+        key = cls.cache_key(control_set, height)
+        try:
+            curve = cls._cache[key]
+        except KeyError:
+            curve = cls(control_set, height)
+            cls._cache[key] = curve
+            if len(cls._cache) > CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        else:
+            cls._cache.move_to_end(key)
+        return curve
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+def bezierCurve(cPoints, u):
+    """ Calculate cubic bezier curve between two points
+        input: control points, vertex_location in the 2D map
+        output: list
+
+    """
+
+    return (cPoints[0]*((1-u)**3) + cPoints[1]*3*u*((1-u)**2) + cPoints[2]*(3*u**2)*(1-u) + cPoints[3]*(u**3))
+
+
+def bernstein_basis(u):
+    """ Cubic Bernstein basis evaluated at every parameter value.
+
+        Input:  float array (M)
+        Output: float array (M x 4)
+    """
+
+    u = np.asarray(u, dtype=np.float64)
+    v = 1 - u
+    return np.stack((v ** 3, 3 * u * v ** 2, 3 * u ** 2 * v, u ** 3), axis=1)
+
+
+def segment_table(lengths, n_segments):
+    """ Split every distinct row/column length into the curve segments.
+
+        A length is split into n_segments equal (possibly fractional) parts, with
+        the residual distributed by adding an extra row/column (ceil) to the
+        first segments.
+
+        Input:  int array (M) lengths, number of curve segments
+        Output: distinct lengths (U), inverse (M) indices into them,
+                segment sizes (U x n_segments), segment ends (U x n_segments)
+    """
+
+    unique, inverse = np.unique(np.asarray(lengths, dtype=np.int64), return_inverse=True)
+    inner = unique - (n_segments - 1)
+    segment_length = inner / n_segments
+    residual = inner % n_segments
+
+    has_extra = np.arange(n_segments)[None, :] < residual[:, None]
+    sizes = np.where(has_extra, np.ceil(segment_length)[:, None], segment_length[:, None])
+    return unique, inverse.reshape(-1), sizes, np.cumsum(sizes, axis=1)
+
+
+def extrude(ranks, brackets, middle_rank, control_points_y, limits, evaluate=None):
+    """ Calculate the extrusion of vertices along their row/column with the cubic bezier curve segments.
+
+        Each vertex is placed in the segment its position between the brackets
+        falls into, the curve parameter is taken from the position in the segment.
+        Vertices past the middle rank get their control points scaled down
+        linearly by the distance to the middle. Vertices with zero-length
+        brackets lie on the border and get 0.0.
+
+        The beziers are evaluated exactly, unless an evaluate(segment, u) function
+        (e.g. a lookup table of the curve) is given.
+
+        Input:  int array (M) vertex row/column, int array (M x 2) boundary
+                row/column, middle row/column, float array (K x 4) control points,
+                float array (K x 2) x-limits of each segment, optional function
+        Output: float array (M)
+    """
+
+    ranks = np.asarray(ranks, dtype=np.int64)
+    brackets = np.asarray(brackets, dtype=np.int64).reshape(-1, 2)
+    control_points_y = np.asarray(control_points_y, dtype=np.float64)
+    limits = np.asarray(limits, dtype=np.float64)
+    n_segments = len(control_points_y)
+
+    values = np.zeros(len(ranks))
+    on_curve = np.nonzero(brackets[:, 1] != brackets[:, 0])[0]
+    if not len(on_curve):
+        return values
+
+    lengths = brackets[on_curve, 1] - brackets[on_curve, 0]
+    positions = ranks[on_curve] - brackets[on_curve, 0]
+
+    # Find the segment the vertex position belongs to in its row/column
+    unique, inverse, sizes, ends = segment_table(lengths, n_segments)
+    reached = positions[:, None] <= ends[inverse]
+    segment = np.where(reached.any(axis=1), reached.argmax(axis=1), n_segments - 1)
+    current_segment = sizes[inverse, segment]
+    segment_end = ends[inverse, segment]
+
+    # Cubic beziers are calculated in UV space, where the coordinate system limits are in the range 0-1.
+    # The step is the doubled difference between the x - limits over the n+1 rows/columns of a segment.
+    step = 2 * (limits[segment, 1] - limits[segment, 0]) / (current_segment + 1)
+    U = step * (current_segment - (segment_end - positions))
+
+    # Linear interpolation of the extrusion, based on the distance between the middle and current column/row
+    scale = np.ones(len(on_curve))
+    past_middle = ranks[on_curve] > middle_rank
+    scale[past_middle] = (2 * middle_rank - ranks[on_curve][past_middle]) / middle_rank
+
+    if evaluate is None:
+        values[on_curve] = scale * np.einsum('ij,ij->i', bernstein_basis(U), control_points_y[segment])
+    else:
+        values[on_curve] = scale * evaluate(segment, U)
+    return values
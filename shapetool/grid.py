@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def ranks_from_order(order):
+    """ Invert a permutation: the rank of every element in the given order.
+
+        Input:  int array with the element indices in the wanted order
+        Output: int array, rank[element] = position in order
+    """
+
+    order = np.asarray(order, dtype=np.int64)
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order), dtype=np.int64)
+    return ranks
+
+
+def z_order(z):
+    """ Order of the vertices by z-coordinate, highest first.
+
+        Ties keep their input order, the same as sorted(..., reverse=True).
+    """
+
+    return np.argsort(-np.asarray(z, dtype=np.float64), kind='stable')
+
+
+def boundary_brackets(span_rank, value_rank, interior, edges):
+    """ Find the closest boundary values around each interior vertex.
+
+        Every boundary edge covers the ranks strictly between its two vertices
+        (span_rank). The interior vertices in that range receive the value_rank of
+        the edge vertex with the lower span_rank as a candidate boundary. For each
+        interior vertex the nearest candidate below and above its own value_rank
+        is kept. When there is none on one side, the min/max candidate is used,
+        vertices without any candidate get a zero-length bracket (own, own).
+
+        Input:  int array (N), int array (N), bool array (N), int array (E x 2)
+        Output: int array (N x 2) with (lower, upper) per vertex
+    """
+
+    span_rank = np.asarray(span_rank, dtype=np.int64)
+    value_rank = np.asarray(value_rank, dtype=np.int64)
+    n = len(span_rank)
+
+    brackets = np.repeat(value_rank[:, None], 2, axis=1)
+    if not len(edges) or not n:
+        return brackets
+
+    edges = np.asarray(edges, dtype=np.int64)
+    span_a = span_rank[edges[:, 0]]
+    span_b = span_rank[edges[:, 1]]
+    low = np.minimum(span_a, span_b)
+    values = np.where(span_a < span_b, value_rank[edges[:, 0]], value_rank[edges[:, 1]])
+
+    # Expand every edge into the ranks it covers (arange per edge, without a loop)
+    counts = np.maximum(np.maximum(span_a, span_b) - low - 1, 0)
+    total = int(counts.sum())
+    if not total:
+        return brackets
+    starts = np.cumsum(counts) - counts
+    covered = np.repeat(low + 1, counts) + (np.arange(total, dtype=np.int64) - np.repeat(starts, counts))
+    candidates = np.repeat(values, counts)
+
+    vertex_at_rank = np.empty(n, dtype=np.int64)
+    vertex_at_rank[span_rank] = np.arange(n, dtype=np.int64)
+    vertices = vertex_at_rank[covered]
+    keep = interior[vertices]
+    vertices = vertices[keep]
+    candidates = candidates[keep]
+
+    # One sorted key space: each vertex owns the block [v * stride, (v + 1) * stride)
+    stride = np.int64(n + 1)
+    keys = np.sort(vertices * stride + candidates)
+
+    query = np.nonzero(interior)[0]
+    block = query * stride
+    first = np.searchsorted(keys, block)
+    last = np.searchsorted(keys, block + stride)
+    own = np.searchsorted(keys, block + value_rank[query])
+
+    found = last > first
+    query, block, first, last, own = query[found], block[found], first[found], last[found], own[found]
+
+    lower = np.where(own > first, keys[np.maximum(own - 1, 0)], keys[first])
+    upper = np.where(own < last, keys[np.minimum(own, len(keys) - 1)], keys[last - 1])
+    brackets[query, 0] = lower - block
+    brackets[query, 1] = upper - block
+    return brackets
+
+
+def build_grid(column_order, z, border, edges):
+    """ Create a 2D map of the shape vertices, where each vertex has a unique column and row.
+
+        Columns follow the given (angular) order of the vertices, rows follow the
+        z-coordinate from top to bottom. The shape loop edges add the boundaries
+        of every interior vertex's row and column.
+
+        Input:  int array (N) vertex order, float array (N) z-coordinates,
+                bool array (N) shape loop mask, int array (E x 2) shape loop edges
+        Output: columns (N), rows (N), column_rows (N x 2), row_columns (N x 2),
+                middle_X, middle_Y (vertex positions in the input arrays, -1 without vertices)
+    """
+
+    border = np.asarray(border, dtype=bool)
+    interior = ~border
+    columns = ranks_from_order(column_order)
+    row_order = z_order(z)
+    rows = ranks_from_order(row_order)
+
+    column_rows = boundary_brackets(columns, rows, interior, edges)
+    row_columns = boundary_brackets(rows, columns, interior, edges)
+
+    if not len(columns):
+        return columns, rows, column_rows, row_columns, -1, -1
+
+    grid_mid = round(len(columns) / 2)
+    middle_X = int(row_order[grid_mid])
+    middle_Y = int(np.asarray(column_order)[grid_mid])
+
+    return columns, rows, column_rows, row_columns, middle_X, middle_Y
@@ -0,0 +1,172 @@
+""" Buffered logging to logfile.txt.
+
+    Messages below Logger.LEVEL are dropped before they are formatted. The rest
+    go to a bounded queue which a background thread writes out in batches, so a
+    log call does no file I/O. The file is rotated when it grows over MAX_BYTES.
+    Logger.flush() waits until everything queued is on disk, at most FLUSH_TIMEOUT
+    seconds; it runs at exit too. If the file can't be written, the messages are
+    dropped and counted in Logger.failed, the first error is printed to stderr.
+    If the file can't be rotated, the messages are appended to the current one.
+
+        Logger.log("Grid mid: {}", grid_mid)
+        Logger.debug("Angles: {}", angles)
+"""
+
+import atexit
+import os
+import queue
+import sys
+import threading
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+class Logger:
+    LOGGER_ENABLED = True
+    LEVEL = INFO
+    FILE_NAME = 'logfile.txt'
+    MAX_BYTES = 10 * 1024 * 1024
+    BACKUPS = 3
+    QUEUE_SIZE = 10000
+    BATCH_SIZE = 1000
+    FLUSH_TIMEOUT = 5.0 # seconds
+
+    dropped = 0 # messages lost because the queue was full
+    failed = 0 # messages lost because the file could not be written
+    _reported = False # an error was printed to stderr
+    _queue = None
+    _thread = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled(level=INFO):
+        return Logger.LOGGER_ENABLED and level >= Logger.LEVEL
+
+    @staticmethod
+    def log(msg, *args, level=INFO):
+        """ Queue a message, msg.format(*args) is only done if the level is enabled. """
+        if not Logger.enabled(level):
+            return
+        if args:
+            msg = msg.format(*args)
+        Logger._start()
+        try:
+            Logger._queue.put_nowait("{}: {}\n".format(LEVEL_NAMES.get(level, level), msg))
+        except queue.Full:
+            Logger.dropped += 1
+
+    @staticmethod
+    def debug(msg, *args):
+        Logger.log(msg, *args, level=DEBUG)
+
+    @staticmethod
+    def info(msg, *args):
+        Logger.log(msg, *args, level=INFO)
+
+    @staticmethod
+    def warning(msg, *args):
+        Logger.log(msg, *args, level=WARNING)
+
+    @staticmethod
+    def error(msg, *args):
+        Logger.log(msg, *args, level=ERROR)
+
+    @staticmethod
+    def flush(timeout=None):
+        """ Wait until all queued messages are written to the file, at most timeout
+            seconds (Logger.FLUSH_TIMEOUT by default).
+
+            Output: True if the queue was emptied
+        """
+        if Logger._queue is None:
+            return True
+        if timeout is None:
+            timeout = Logger.FLUSH_TIMEOUT
+        done = Logger._queue.all_tasks_done
+        with done:
+            return done.wait_for(lambda: not Logger._queue.unfinished_tasks, timeout)
+
+    @staticmethod
+    def _start():
+        if Logger._thread is not None:
+            return
+        with Logger._lock:
+            if Logger._thread is None:
+                Logger._queue = queue.Queue(Logger.QUEUE_SIZE)
+                Logger._thread = threading.Thread(target=Logger._write, name='shapetool-logger', daemon=True)
+                Logger._thread.start()
+                atexit.register(Logger.flush)
+
+    @staticmethod
+    def _rotate(f):
+        """ Move the full file to the backups and start a new one.
+
+            If the backups can't be moved, the current file is kept and appended to.
+            Output: the file to write to, None if the new file can't be opened
+        """
+        try:
+            for i in range(Logger.BACKUPS - 1, 0, -1):
+                if os.path.exists("{}.{}".format(Logger.FILE_NAME, i)):
+                    os.replace("{}.{}".format(Logger.FILE_NAME, i), "{}.{}".format(Logger.FILE_NAME, i + 1))
+            if Logger.BACKUPS:
+                os.replace(Logger.FILE_NAME, Logger.FILE_NAME + ".1")
+        except OSError as error:
+            Logger._report("can't rotate", error)
+            return f
+        f.close()
+        try:
+            return open(Logger.FILE_NAME, 'w')
+        except OSError as error:
+            Logger._report("can't open", error)
+            return None
+
+    @staticmethod
+    def _report(what, error):
+        if not Logger._reported:
+            Logger._reported = True
+            sys.stderr.write("Logger: {} {}: {}\n".format(what, Logger.FILE_NAME, error))
+
+    @staticmethod
+    def _write():
+        """ Background writer - one write and flush per batch of queued messages.
+
+            The file is (re)opened lazily, so a failed open or write loses only the
+            current batch and the next batch tries again. Only the first open
+            truncates the file, a reopen appends to it.
+        """
+        f = None
+        mode = 'w'
+        while True:
+            lines = [Logger._queue.get()]
+            while len(lines) < Logger.BATCH_SIZE:
+                try:
+                    lines.append(Logger._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if f is None:
+                    f = open(Logger.FILE_NAME, mode)
+                    mode = 'a'
+                f.write("".join(lines))
+                f.flush()
+            except Exception as error:
+                Logger._report("can't write", error)
+                Logger.failed += len(lines)
+                if f is not None:
+                    try:
+                        f.close()
+                    except Exception:
+                        pass
+                    f = None
+            else:
+                if f.tell() > Logger.MAX_BYTES:
+                    f = Logger._rotate(f)
+            finally:
+                for _ in lines:
+                    Logger._queue.task_done()
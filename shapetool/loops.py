@@ -0,0 +1,152 @@
+import heapq
+
+import numpy as np
+
+
+GAP_NEIGHBOURS = 8  # nearest candidates looked up for every gap vertex
+LEAF_SIZE = 16  # points per k-d tree leaf
+
+
+def vertex_degrees(edges, count):
+    """ Count the edges linked to every vertex in one pass over the edges.
+
+        Input:  int array (E x 2), number of vertices
+        Output: int array (count)
+    """
+
+    return np.bincount(np.asarray(edges, dtype=np.int64).reshape(-1), minlength=count)
+
+
+def degree_histogram(degrees):
+    """ Number of vertices per edge count, e.g. {1: gap vertices, 2: loop vertices, 3: shortcuts}.
+
+        Input:  int array (N)
+        Output: dict{degree: number of vertices}
+    """
+
+    counts = np.bincount(np.asarray(degrees, dtype=np.int64))
+    return {degree: int(n) for degree, n in enumerate(counts.tolist()) if n}
+
+
+class KDTree(object):
+    """ Static k-d tree of points, for the nearest neighbour lookups of the loop repair.
+
+        The points are split at the median of their widest axis until a node
+        holds at most leaf_size points. The leaves are searched with NumPy.
+    """
+
+    def __init__(self, co, leaf_size=LEAF_SIZE):
+        self.co = np.asarray(co, dtype=np.float64).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self.nodes = []  # (axis, split, left, right) per node, axis -1 and the point indices for a leaf
+        self.root = self._build(np.arange(len(self.co), dtype=np.int64))
+
+    def __len__(self):
+        return len(self.co)
+
+    def _build(self, indices):
+        node = len(self.nodes)
+        if len(indices) <= self.leaf_size:
+            self.nodes.append((-1, 0.0, indices, None))
+            return node
+
+        co = self.co[indices]
+        axis = int(np.argmax(co.max(axis=0) - co.min(axis=0)))
+        middle = len(indices) // 2
+        order = np.argpartition(co[:, axis], middle)
+        self.nodes.append(None)
+        left = self._build(indices[order[:middle]])
+        right = self._build(indices[order[middle:]])
+        self.nodes[node] = (axis, float(co[order[middle], axis]), left, right)
+        return node
+
+    def find_n(self, co, n):
+        """ The n nearest points, closest first.
+
+            Input:  point (3), number of points
+            Output: float array (n) distances, int array (n) point indices
+        """
+
+        co = np.asarray(co, dtype=np.float64)
+        n = min(n, len(self.co))
+        best = []  # max-heap of (-squared distance, -index) of the n nearest so far
+        if n < 1:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == n and bound > -best[0][0]:
+                continue
+            axis, split, left, right = self.nodes[node]
+            if axis < 0:
+                squared = np.einsum('ij,ij->i', self.co[left] - co, self.co[left] - co)
+                for d, i in zip(squared.tolist(), left.tolist()):
+                    if len(best) < n:
+                        heapq.heappush(best, (-d, -i))
+                    elif (-d, -i) > best[0]:
+                        heapq.heapreplace(best, (-d, -i))
+                continue
+            offset = co[axis] - split
+            near, far = (left, right) if offset < 0 else (right, left)
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+
+        best.sort(reverse=True)
+        return np.sqrt([-d for d, _ in best]), np.array([-i for _, i in best], dtype=np.int64)
+
+
+def gap_candidates(co, joined=(), neighbours=GAP_NEIGHBOURS):
+    """ Nearest candidate pairs between the gap vertices, from a k-d tree.
+
+        Pairs already joined by an edge are no candidates.
+
+        Input:  float array (G x 3), int array (J x 2) joined vertex pairs, candidates per vertex
+        Output: float array (C) distances, int arrays (C) vertices of each candidate
+    """
+
+    co = np.asarray(co, dtype=np.float64).reshape(-1, 3)
+    k = min(neighbours, len(co) - 1)
+    if k < 1:
+        return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    joined = {tuple(pair) for pair in np.asarray(joined, dtype=np.int64).reshape(-1, 2).tolist()}
+    tree = KDTree(co)
+    distances, first, second = [], [], []
+    for i in range(len(co)):
+        found, nearest = tree.find_n(co[i], k + 1)
+        for dist, j in zip(found.tolist(), nearest.tolist()):
+            if j != i and (i, j) not in joined and (j, i) not in joined:
+                distances.append(dist)
+                first.append(i)
+                second.append(j)
+
+    return np.array(distances), np.array(first, dtype=np.int64), np.array(second, dtype=np.int64)
+
+
+def match_pairs(count, distances, first, second):
+    """ Pair up vertices from candidate pairs, shortest distance first.
+
+        Every vertex is used in at most one pair, so the matching is consistent
+        over the whole loop: a vertex can't be connected to two gaps, and the
+        same pair is never listed twice as (a, b) and (b, a).
+
+        Input:  number of vertices, float array (C) distances, int arrays (C) vertices of each candidate
+        Output: list of (vertex, vertex) pairs, list of unmatched vertices
+    """
+
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    order = np.argsort(np.asarray(distances, dtype=np.float64), kind='stable')
+
+    used = set()
+    pairs = []
+    for a, b in zip(first[order].tolist(), second[order].tolist()):
+        if a == b or a in used or b in used:
+            continue
+        used.add(a)
+        used.add(b)
+        pairs.append((a, b))
+
+    unmatched = [v for v in range(count) if v not in used]
+    return pairs, unmatched
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+QUADRANTS = ('Q1', 'Q2', 'Q3', 'Q4')
+AXES = {'x': 0, 'y': 1}
+
+
+def quadrant_codes(xy):
+    """ Quadrant of every point in the XY plane.
+
+        Points on an axis (x or y equal to 0) belong to no quadrant.
+
+        Input:  float array (N x 2) or (N x 3)
+        Output: int8 array (N), 1-4 for Q1-Q4, 0 on an axis
+    """
+
+    xy = np.asarray(xy, dtype=np.float64)
+    x, y = xy[:, 0], xy[:, 1]
+    codes = np.zeros(len(xy), dtype=np.int8)
+    codes[(x > 0) & (y > 0)] = 1
+    codes[(x < 0) & (y > 0)] = 2
+    codes[(x < 0) & (y < 0)] = 3
+    codes[(x > 0) & (y < 0)] = 4
+    return codes
+
+
+class QuadrantMap(object):
+    """ Points classified by quadrant, with the index arrays of every quadrant
+        sorted by x and the min/max of x and y per quadrant precomputed.
+
+        The quadrant codes are computed once. Min/max queries over any set of
+        quadrants compare the precomputed reductions only. Ties are resolved to
+        the lowest point index, as min() and max() over the points would.
+    """
+
+    def __init__(self, xy):
+        xy = np.asarray(xy, dtype=np.float64)
+        self.xy = xy[:, :2]
+        self.codes = quadrant_codes(xy)
+
+        # points grouped by quadrant code (axis points first), ascending x within a quadrant
+        self._ascending = np.lexsort((self.xy[:, 0], self.codes))
+        self._descending = None
+        self._bounds = np.concatenate(([0], np.cumsum(np.bincount(self.codes, minlength=5))))
+
+        # index of the min and max point per quadrant code (0-4) and axis, -1 when empty
+        self._argmin = np.full((5, 2), -1, dtype=np.int64)
+        self._argmax = np.full((5, 2), -1, dtype=np.int64)
+        for code in range(5):
+            indices = self._ascending[self._bounds[code]:self._bounds[code + 1]]
+            if not len(indices):
+                continue
+            for axis in (0, 1):
+                values = self.xy[indices, axis]
+                self._argmin[code, axis] = indices[values == values.min()].min()
+                self._argmax[code, axis] = indices[values == values.max()].min()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def coverage(self):
+        """ Names of the quadrants with at least one point. """
+        return [name for code, name in enumerate(QUADRANTS, 1) if self._bounds[code + 1] > self._bounds[code]]
+
+    def indices(self, quadrant, descending=False):
+        """ Point indices of a quadrant, sorted by x.
+
+            Input:  'Q1'-'Q4', sort order
+            Output: int array
+        """
+        code = QUADRANTS.index(quadrant) + 1
+        if not descending:
+            return self._ascending[self._bounds[code]:self._bounds[code + 1]]
+        if self._descending is None:
+            self._descending = np.lexsort((-self.xy[:, 0], self.codes))
+        return self._descending[self._bounds[code]:self._bounds[code + 1]]
+
+    def argmin(self, axis, quadrants=None):
+        """ Index of the point with the smallest coordinate.
+
+            Input:  'x' or 'y', quadrant names or None for all the points
+            Output: point index, -1 if there are no points
+        """
+        return self._extreme(self._argmin, axis, quadrants, np.less)
+
+    def argmax(self, axis, quadrants=None):
+        """ Index of the point with the largest coordinate.
+
+            Input:  'x' or 'y', quadrant names or None for all the points
+            Output: point index, -1 if there are no points
+        """
+        return self._extreme(self._argmax, axis, quadrants, np.greater)
+
+    def _extreme(self, table, axis, quadrants, better):
+        axis = AXES[axis]
+        codes = range(5) if quadrants is None else [QUADRANTS.index(q) + 1 for q in quadrants]
+        best = -1
+        for code in codes:
+            i = table[code, axis]
+            if i < 0:
+                continue
+            if best < 0 or better(self.xy[i, axis], self.xy[best, axis]) or \
+                    (self.xy[i, axis] == self.xy[best, axis] and i < best):
+                best = i
+        return int(best)
@@ -0,0 +1,157 @@
+""" Lightweight tracing of the apply-shape pipeline stages.
+
+    A Tracer collects spans (wall time of a stage, with optional counts before and
+    after it, e.g. vertices/edges/faces) and counters (e.g. mode switches). The
+    module keeps one active tracer, so the pipeline functions can open spans
+    without passing it around; with no active tracer spans cost nothing.
+
+        tracer = trace.start('apply')
+        with trace.span('make_grid', counts=lambda: mesh_counts(obj)):
+            ...
+        trace.stop()
+        tracer.write('apply.json', format='chrome')
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+class Span(object):
+    __slots__ = ('name', 'start', 'duration', 'before', 'after', 'depth')
+
+    def __init__(self, name, start, depth, before=None):
+        self.name = name
+        self.start = start
+        self.duration = 0.0
+        self.before = before
+        self.after = None
+        self.depth = depth
+
+    def to_dict(self):
+        return {'name': self.name,
+                'start': self.start,
+                'duration': self.duration,
+                'depth': self.depth,
+                'before': self.before,
+                'after': self.after}
+
+
+class Tracer(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.duration = 0.0
+        self.spans = []
+        self.counters = {}
+        self._depth = 0
+
+    @contextmanager
+    def span(self, name, counts=None):
+        """ Time the enclosed block. counts is a function returning a dict, called before and after it. """
+        span = Span(name, time.perf_counter() - self.origin, self._depth, counts() if counts else None)
+        self.spans.append(span)
+        self._depth += 1
+        try:
+            yield span
+        finally:
+            self._depth -= 1
+            span.duration = time.perf_counter() - self.origin - span.start
+            if counts:
+                span.after = counts()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.origin
+
+    def stages(self):
+        """ Total time and number of calls per span name.
+
+            Output: dict{name: {'calls': int, 'total': float}}
+        """
+        stages = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {'calls': 0, 'total': 0.0})
+            stage['calls'] += 1
+            stage['total'] += span.duration
+        return stages
+
+    def summary(self):
+        """ One line per stage, slowest first. """
+        stages = sorted(self.stages().items(), key=lambda item: item[1]['total'], reverse=True)
+        lines = ["{}: {:.4f} sec".format(self.name, self.duration)]
+        lines += ["  {:<24} {:.4f} sec ({} calls)".format(name, stage['total'], stage['calls']) for name, stage in stages]
+        lines += ["  {:<24} {}".format(name, value) for name, value in sorted(self.counters.items())]
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {'name': self.name,
+                'duration': self.duration,
+                'stages': self.stages(),
+                'counters': dict(self.counters),
+                'spans': [span.to_dict() for span in self.spans]}
+
+    def to_chrome_trace(self):
+        """ The spans as Chrome trace events (chrome://tracing, Perfetto). """
+        events = []
+        for span in self.spans:
+            events.append({'name': span.name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                           'ts': span.start * 1e6, 'dur': span.duration * 1e6,
+                           'args': {'before': span.before, 'after': span.after}})
+        events.append({'name': 'counters', 'ph': 'C', 'pid': os.getpid(), 'tid': 0,
+                       'ts': self.duration * 1e6, 'args': dict(self.counters)})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'name': self.name}}
+
+    def write(self, path, format='json'):
+        """ Export the trace, format is 'json' or 'chrome'. """
+        data = self.to_chrome_trace() if format == 'chrome' else self.to_dict()
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+
+_active = None
+_last = None
+
+
+def start(name):
+    """ Start a new trace and make it the active one. """
+    global _active
+    _active = Tracer(name)
+    return _active
+
+
+def stop():
+    """ Stop the active trace, it stays available with last(). """
+    global _active, _last
+    if _active is not None:
+        _active.stop()
+        _last = _active
+    _active = None
+    return _last
+
+
+def active():
+    return _active
+
+
+def last():
+    return _last
+
+
+@contextmanager
+def span(name, counts=None):
+    """ Span of the active tracer, or nothing when there is none. """
+    if _active is None:
+        yield None
+    else:
+        with _active.span(name, counts) as s:
+            yield s
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
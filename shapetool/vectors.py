@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+
+
+DEGREES = 180.0 / math.pi
+
+
+def as_vectors(v):
+    """ Input:  vector or array of vectors (N x D)
+        Output: float array (N x D)
+    """
+    v = np.asarray(v, dtype=np.float64)
+    return v.reshape(1, -1) if v.ndim == 1 else v
+
+
+def norms(v):
+    """ Length of every vector.
+
+        Input:  float array (N x D)
+        Output: float array (N)
+    """
+    v = as_vectors(v)
+    return np.sqrt(np.einsum('ij,ij->i', v, v))
+
+
+def angles(v1, v2, degrees=True):
+    """ Angle between every pair of vectors.
+
+        The cosine is clamped to [-1, 1] before acos, so rounding errors on
+        (anti)parallel vectors do not give NaN. A zero-length vector gives NaN.
+
+        Input:  float arrays (N x D) or one of them a single vector, degrees or radians
+        Output: float array (N)
+    """
+    v1, v2 = as_vectors(v1), as_vectors(v2)
+    if v1.shape[1] != v2.shape[1]:
+        raise ValueError("Vectors of different lengths: {} and {}".format(v1.shape[1], v2.shape[1]))
+
+    dot = np.einsum('ij,ij->i', *np.broadcast_arrays(v1, v2))
+    squared_lengths = np.einsum('ij,ij->i', v1, v1) * np.einsum('ij,ij->i', v2, v2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos = dot / np.sqrt(squared_lengths)
+    result = np.arccos(np.clip(cos, -1.0, 1.0))
+    return np.degrees(result) if degrees else result
+
+
+def polar_angles(xy, degrees=True):
+    """ Polar angle of points in the XY plane, without their radius.
+
+        Input:  float array (N x 2) or (N x 3), degrees or radians
+        Output: float array (N), in the range (-180, 180]
+    """
+    xy = as_vectors(xy)
+    theta = np.arctan2(xy[:, 1], xy[:, 0])
+    return np.degrees(theta) if degrees else theta
+
+
+def to_polar(xy, degrees=True):
+    """ Polar coordinates of points in the XY plane.
+
+        Input:  float array (N x 2) or (N x 3), degrees or radians
+        Output: float array (N) radius, float array (N) angle in the range (-180, 180]
+    """
+    xy = as_vectors(xy)
+    return np.hypot(xy[:, 0], xy[:, 1]), polar_angles(xy, degrees)
+
+
+def from_polar(radius, theta, degrees=True):
+    """ Input:  float arrays (N) radius and angle, degrees or radians
+        Output: float array (N x 2)
+    """
+    theta = np.radians(theta) if degrees else np.asarray(theta, dtype=np.float64)
+    return np.stack((radius * np.cos(theta), radius * np.sin(theta)), axis=-1)
+
+
+def norm(v):
+    """ Length of one vector. """
+    return math.sqrt(sum(c * c for c in v))
+
+
+def angle(v1, v2, degrees=True):
+    """ Angle between two vectors, see angles. 2D vectors take a shortcut
+        without the generic sums, this is the per-call path of the tools.
+
+        Raises ValueError for vectors of different lengths or a zero-length vector.
+    """
+    if len(v1) == 2 and len(v2) == 2:
+        x1, y1 = v1
+        x2, y2 = v2
+        dot = x1 * x2 + y1 * y2
+        squared_lengths = (x1 * x1 + y1 * y1) * (x2 * x2 + y2 * y2)
+    elif len(v1) != len(v2):
+        raise ValueError("Vectors of different lengths: {} and {}".format(len(v1), len(v2)))
+    else:
+        dot = sum(a * b for a, b in zip(v1, v2))
+        squared_lengths = sum(a * a for a in v1) * sum(b * b for b in v2)
+    if not squared_lengths:
+        raise ValueError("Angle with a zero-length vector: {} {}".format(tuple(v1), tuple(v2)))
+
+    cos = dot / math.sqrt(squared_lengths)
+    result = math.acos(1.0 if cos > 1.0 else -1.0 if cos < -1.0 else cos)
+    return result * DEGREES if degrees else result
+
+
+def polar(xy, degrees=True):
+    """ Radius and angle of one point in the XY plane, see to_polar. """
+    theta = math.atan2(xy[1], xy[0])
+    return math.hypot(xy[0], xy[1]), (math.degrees(theta) if degrees else theta)
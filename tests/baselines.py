@@ -0,0 +1,81 @@
+""" Ports of the old MatrixApproach extrusion loop and shape_grid dict, and the
+    curve profiles the tests compare them on.
+"""
+
+import math
+
+
+def segment(start, start_control, end_control, end):
+    return {'start': {'position': {'x': start[0], 'y': start[1]},
+                      'control': {'x': start_control[0], 'y': start_control[1]}},
+            'end': {'position': {'x': end[0], 'y': end[1]},
+                    'control': {'x': end_control[0], 'y': end_control[1]}}}
+
+
+CURVES = {'two segments': [segment((0, 1), (0, 0.75), (0.25, 0.33), (0.5, 0.33)),
+                           segment((0.5, 0.33), (0.75, 0.33), (1, 0.75), (1, 1))],
+          'three segments': [segment((0, 1), (0.1, 0.5), (0.2, 0.2), (0.3, 0.1)),
+                             segment((0.3, 0.1), (0.4, 0.0), (0.6, 0.0), (0.7, 0.1)),
+                             segment((0.7, 0.1), (0.8, 0.2), (0.9, 0.5), (1, 1))]}
+HEIGHT = 15
+
+
+def bezierCurve(cPoints, u):
+    return (cPoints[0]*((1-u)**3) + cPoints[1]*3*u*((1-u)**2) + cPoints[2]*(3*u**2)*(1-u) + cPoints[3]*(u**3))
+
+
+def baseline_extrusion(data, curve, seq_type, middle_vertex):
+    """ The old calculate_extrusion, with the middle vertex given as its
+        index in data instead of the BMVert.
+
+        Output: dict{vertex index: extrude value}
+    """
+
+    n_segments = len(curve._control_set)
+    seq_range = 'row_columns' if seq_type == 'column' else 'column_rows'
+    data_extruded = {}
+    for vertex_index, vertex in data.items():
+        if 'border_vertex' in vertex:
+            continue
+        data_length = vertex[seq_range][1] - vertex[seq_range][0]
+        if not data_length:
+            data_extruded[vertex_index] = 0.0
+            continue
+
+        segment_length = (data_length - (n_segments - 1)) / n_segments
+        residual = (data_length - (n_segments - 1)) % n_segments
+        vertex_position = vertex[seq_type] - vertex[seq_range][0]
+        segments = []
+        for segment in range(n_segments):
+            if residual:
+                current_segment = math.ceil(segment_length)
+                residual -= 1
+            else:
+                current_segment = segment_length
+            segments.append(current_segment)
+            if vertex_position <= sum(segments):
+                break
+
+        limits = curve.control_points_limits[segment]
+        step = 2 * (limits[1] - limits[0]) / (current_segment + 1)
+        U = step * (segments[segment] - (sum(segments) - vertex_position))
+        middle = data[middle_vertex][seq_type]
+        if vertex_index != middle_vertex:
+            index = middle - (vertex[seq_type] - middle) if vertex[seq_type] > middle else middle
+            control_points = [index * control_point / middle for control_point in curve.control_points_y[segment]]
+            data_extruded[vertex_index] = bezierCurve(control_points, U)
+        else:
+            data_extruded[vertex_index] = bezierCurve(curve.control_points_y[segment], U)
+    return data_extruded
+
+
+def grid_data(shape_grid):
+    """ The shape_grid dict of the old make_grid. """
+    data = {}
+    for vertex in shape_grid:
+        data[vertex.local] = {'column': vertex.column, 'row': vertex.row}
+        if vertex.border_vertex:
+            data[vertex.local]['border_vertex'] = True
+        else:
+            data[vertex.local].update(column_rows=vertex.column_rows, row_columns=vertex.row_columns)
+    return data
@@ -0,0 +1,11 @@
+""" Test setup: the tests import shapetool and the synthetic meshes of the
+    benchmarks from the repository, without installing anything.
+"""
+
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
@@ -0,0 +1,95 @@
+""" angular.angular_order against a port of the shellsort and gap scan of the
+    old MatrixApproach.get_shape_limits.
+
+    The old scan split the order at the first gap above the threshold, the new
+    one at the largest gap. The meshes here have at most one gap above the
+    threshold, where both agree.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from shapetool import angular
+from socket_mesh import socket_mesh
+
+
+def baseline_angle(x, y):
+    theta_rad = math.atan2(y, x)
+    return theta_rad / math.pi * 180 + (360 if theta_rad < 0 else 0)
+
+
+def shellsort(data):
+    gap = len(data) // 2
+    while gap > 0:
+        for i in range(gap, len(data)):
+            j = i - gap
+            while j >= 0 and data[j][0] > data[j + gap][0]:
+                data[j], data[j + gap] = data[j + gap], data[j]
+                j -= gap
+        gap //= 2
+
+
+def baseline_order(xy, offset=2, stable=False):
+    """ The vertex order of the old get_shape_limits. The shellsort leaves equal
+        angles in any order, stable=True sorts them in input order instead.
+
+        Output: list of point indices
+    """
+
+    vtxmap = [(baseline_angle(x, y), i) for i, (x, y) in enumerate(xy)]
+    if stable:
+        vtxmap.sort(key=lambda item: item[0])
+    else:
+        shellsort(vtxmap)
+
+    for i in range(len(vtxmap)):
+        safe_index = min(i + 1, len(vtxmap) - 1)
+        if vtxmap[safe_index][0] - vtxmap[i][0] > offset:
+            return [index for _, index in vtxmap[i::-1] + vtxmap[:i:-1]]
+    return [index for _, index in vtxmap]
+
+
+def circle(degrees, radius=1.0):
+    theta = np.radians(degrees)
+    return np.stack((radius * np.cos(theta), radius * np.sin(theta)), axis=1)
+
+
+@pytest.mark.parametrize('quadrants', [1, 2, 3, 4])
+def test_socket_shapes_match_baseline(quadrants):
+    # A cylinder of 200 rings, 1.8 degrees apart. Every level repeats the same xy: ties in angle
+    mesh = socket_mesh(20000, quadrants, cone=0.0)
+    xy = mesh.co[mesh.region, :2]
+    xy = xy[np.random.RandomState(quadrants).permutation(len(xy))]
+    order = angular.angular_order(xy)
+    angles = angular.vertex_angles(xy)
+
+    assert order.tolist() == baseline_order(xy.tolist(), stable=True)
+    np.testing.assert_allclose(angles[order], angles[baseline_order(xy.tolist())], rtol=0, atol=1e-12)
+
+
+def test_ties_in_angle_keep_the_input_order():
+    xy = np.concatenate((circle([30, 10, 20]), circle([20, 10, 30], radius=2.0)))
+    assert angular.angular_order(xy).tolist() == [1, 4, 2, 3, 0, 5]
+
+
+@pytest.mark.parametrize('threshold', [2.0, 4.0])
+def test_gap_threshold_split(threshold):
+    # Points every 1.5 degrees around the circle with one 3 degree gap after 148.5
+    degrees = np.delete(np.arange(240) * 1.5, 100)
+    xy = circle(degrees)
+    order = angular.angular_order(xy, threshold)
+
+    assert order.tolist() == baseline_order(xy.tolist(), offset=threshold, stable=True)
+    if threshold < 3:
+        assert degrees[order[[0, -1]]].tolist() == [148.5, 151.5]
+    else:
+        assert degrees[order[[0, -1]]].tolist() == [0.0, 358.5]
+
+
+def test_shape_across_zero_degrees_matches_baseline():
+    xy = circle(np.concatenate((np.arange(0, 40, 1.0), np.arange(300, 360, 1.0))))
+    order = angular.angular_order(xy)
+    assert order.tolist() == baseline_order(xy.tolist())
+    assert order[0] == 39 and order[-1] == 40
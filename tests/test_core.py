@@ -0,0 +1,108 @@
+""" The array-backed ShapeGrid views and blend_curves against the dict
+    structures and the blend loop of the old MatrixApproach.
+"""
+
+import numpy as np
+import pytest
+
+from baselines import CURVES, HEIGHT, baseline_extrusion, grid_data
+from shapetool import core
+from shapetool.curves import ControlPoints
+from socket_mesh import socket_mesh
+
+
+def baseline_blend(shape_grid, curveX, curveY):
+    """ The blend loop of the old blend_curves, on the shape_grid dict.
+
+        Output: dict{mesh vertex index: extrude value}
+    """
+
+    data = grid_data(shape_grid)
+    columnData_extruded = baseline_extrusion(data, curveX, 'row', shape_grid.middle_X)
+    rowData_extruded = baseline_extrusion(data, curveY, 'column', shape_grid.middle_Y)
+
+    extrude_values = {}
+    for local, value in columnData_extruded.items():
+        extrude_values[local] = value / 1000
+    for local, value in rowData_extruded.items():
+        if local != shape_grid.middle_X:
+            extrude_values[local] = (extrude_values[local] + value / 1000) / 2
+    return {int(shape_grid.index[local]): value for local, value in extrude_values.items()}
+
+
+@pytest.fixture(scope='module', params=[3, 4])
+def shape_grid(request):
+    # the middle row vertex is on the border of the 3 quadrant shape and inside the 4 quadrant one
+    mesh = socket_mesh(2000, request.param)
+    return core.make_grid(mesh.co, mesh.region, mesh.border, mesh.edges)
+
+
+def test_grid_vertex_views(shape_grid):
+    assert len(list(shape_grid)) == len(shape_grid)
+    for local in (0, shape_grid.middle_X, len(shape_grid) - 1):
+        vertex = shape_grid.vertex(local)
+        assert (vertex.index, vertex.column, vertex.row) == (shape_grid.index[local], shape_grid.columns[local],
+                                                            shape_grid.rows[local])
+        assert vertex.border_vertex == shape_grid.border[local]
+
+    inner = [vertex for vertex in shape_grid if not vertex.border_vertex]
+    border = [vertex for vertex in shape_grid if vertex.border_vertex]
+    assert inner and border
+    assert all(vertex.column_rows is None and vertex.row_columns is None for vertex in border)
+    assert all(vertex.column_rows == tuple(shape_grid.column_rows[vertex.local]) for vertex in inner)
+    assert all(vertex.row_columns == tuple(shape_grid.row_columns[vertex.local]) for vertex in inner)
+
+    assert shape_grid.nbytes == sum(array.nbytes for array in (shape_grid.index, shape_grid.border, shape_grid.columns,
+                                                               shape_grid.rows, shape_grid.column_rows,
+                                                               shape_grid.row_columns))
+
+
+def test_blend_curves_matches_baseline(shape_grid):
+    indices, values = core.blend_curves(shape_grid, CURVES['two segments'], CURVES['three segments'], HEIGHT)
+    looked_up = dict(zip(indices.tolist(), values.tolist()))
+    exact = baseline_blend(shape_grid, ControlPoints(CURVES['two segments'], HEIGHT),
+                           ControlPoints(CURVES['three segments'], HEIGHT))
+    assert sorted(looked_up) == sorted(exact)
+
+    # the curves are looked up in the tables, the blend of two lookups stays within the larger bound
+    bound = max(ControlPoints.cached(curve, HEIGHT).lut.error_bound().max() for curve in CURVES.values())
+    assert max(abs(looked_up[v] - exact[v]) for v in exact) <= bound / 1000 + 1e-15
+
+
+def test_blend_profiles_weights():
+    column_values, row_values = np.array([1.0, 2.0]), np.array([3.0, 6.0])
+    assert core.blend_profiles(column_values, row_values).tolist() == [2.0, 4.0]
+    assert core.blend_profiles(column_values, row_values, 0.25).tolist() == [2.5, 5.0]
+    assert core.blend_profiles(column_values, row_values, 1.0).tolist() == column_values.tolist()
+
+
+def test_blend_curves_without_curves(shape_grid):
+    indices, values = core.blend_curves(shape_grid, [], [], HEIGHT)
+    assert indices.tolist() == shape_grid.index.tolist()
+    assert values.tolist() == [HEIGHT / 1000] * len(shape_grid)
+
+
+def test_blend_curves_of_an_empty_grid():
+    mesh = socket_mesh(200)
+    empty = core.make_grid(mesh.co, np.zeros(len(mesh.co), dtype=bool), mesh.border, mesh.edges)
+    indices, values = core.blend_curves(empty, CURVES['two segments'], CURVES['two segments'], HEIGHT)
+    assert (len(indices), len(values)) == (0, 0)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_displace_matches_baseline(dtype):
+    random = np.random.RandomState(0)
+    co = random.uniform(-1, 1, (50, 3)).astype(dtype)
+    normals = random.uniform(-1, 1, (50, 3)).astype(dtype)
+    indices = random.choice(50, 20, replace=False)
+    values = random.uniform(0, 0.01, 20)
+
+    original = co.copy()
+    expected = co.copy()
+    for indx, value in zip(indices, values):
+        expected[indx] += normals[indx] * dtype(value)
+
+    displaced = core.displace(co.reshape(-1), normals.reshape(-1), indices, values)
+    assert displaced.dtype == dtype and displaced.shape == (50, 3)
+    np.testing.assert_array_equal(displaced, expected)
+    np.testing.assert_array_equal(co, original)
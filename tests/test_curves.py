@@ -0,0 +1,62 @@
+""" The bezier lookup table of the curve profiles against the exact evaluation. """
+
+import numpy as np
+import pytest
+
+from shapetool import extrusion
+from shapetool.curves import BezierLUT, ControlPoints
+
+
+CURVE = [{'end': {'control': {'x': 0.25, 'y': 0.33},
+                  'position': {'x': 0.5, 'y': 0.33}},
+          'start': {'control': {'x': 0, 'y': 0.75},
+                    'position': {'x': 0, 'y': 1}}},
+         {'end': {'control': {'x': 1, 'y': 0.75},
+                  'position': {'x': 1, 'y': 1}},
+          'start': {'control': {'x': 0.75, 'y': 0.33},
+                    'position': {'x': 0.5, 'y': 0.33}}}]
+HEIGHT = 15
+
+
+@pytest.mark.parametrize('resolution', [16, 256, 1024])
+def test_table_within_error_bound(resolution):
+    control_points = [[15.0, 3.8, 10.1, 10.1], [10.1, 10.1, 3.8, 15.0], [0.0, 40.0, -40.0, 5.0]]
+    limits = [[0.0, 0.5], [0.5, 1.0], [0.2, 0.9]]
+    lut = BezierLUT(control_points, limits, resolution)
+
+    segment = np.repeat(np.arange(3), 5000)
+    u = np.tile(np.linspace(0.0, 1.0, 5000), 3) * lut.u_max[segment]
+    error = np.abs(lut.evaluate(segment, u) - lut.evaluate(segment, u, exact=True))
+
+    bound = lut.error_bound()
+    assert np.all(error <= bound[segment] + 1e-12)
+    # the bound is tight within a factor of two, and shrinks with the square of the resolution
+    assert np.all(error.reshape(3, -1).max(axis=1) >= bound / 2)
+    np.testing.assert_allclose(bound * (resolution - 1) ** 2, BezierLUT(control_points, limits, 2).error_bound())
+
+
+def test_exact_matches_bernstein_product():
+    lut = BezierLUT([[1.0, 2.0, -1.0, 0.5]], [[0.0, 1.0]])
+    u = np.linspace(-0.5, 2.5, 31)
+    expected = [extrusion.bezierCurve([1.0, 2.0, -1.0, 0.5], value) for value in u]
+    np.testing.assert_allclose(lut.evaluate(np.zeros(31, dtype=int), u, exact=True), expected, rtol=1e-12)
+
+
+def test_outside_the_table_is_exact():
+    lut = BezierLUT([[1.0, 2.0, -1.0, 0.5]], [[0.0, 0.5]])
+    u = np.array([-0.25, 1.0 + 1e-9, 3.0])
+    segment = np.zeros(3, dtype=int)
+    assert lut.evaluate(segment, u).tolist() == lut.evaluate(segment, u, exact=True).tolist()
+
+
+def test_extrusion_with_the_table():
+    curve = ControlPoints(CURVE, HEIGHT)
+    ranks = np.arange(100)
+    brackets = np.tile((0, 99), (100, 1))
+    cps = [curve.control_points_y[s] for s in range(2)]
+    limits = [curve.control_points_limits[s] for s in range(2)]
+
+    looked_up = extrusion.extrude(ranks, brackets, 50, cps, limits, curve.evaluate)
+    exact = extrusion.extrude(ranks, brackets, 50, cps, limits, lambda s, u: curve.evaluate(s, u, exact=True))
+    np.testing.assert_array_equal(exact, extrusion.extrude(ranks, brackets, 50, cps, limits))
+    assert np.abs(looked_up - exact).max() <= curve.lut.error_bound().max() + 1e-12
@@ -0,0 +1,57 @@
+""" extrusion.extrude against a port of the per-vertex loop of the old
+    MatrixApproach.calculate_extrusion (see baselines.py).
+"""
+
+import numpy as np
+import pytest
+
+from baselines import CURVES, HEIGHT, baseline_extrusion, grid_data
+from shapetool import core, extrusion
+from shapetool.curves import ControlPoints
+from socket_mesh import socket_mesh
+
+
+@pytest.mark.parametrize('quadrants', [1, 2, 3, 4])
+@pytest.mark.parametrize('curve_name', sorted(CURVES))
+@pytest.mark.parametrize('seq_type', ['row', 'column'])
+def test_extrude_matches_baseline(quadrants, curve_name, seq_type):
+    mesh = socket_mesh(2000, quadrants)
+    shape_grid = core.make_grid(mesh.co, mesh.region, mesh.border, mesh.edges)
+    curve = ControlPoints(CURVES[curve_name], HEIGHT)
+    inner = np.nonzero(~shape_grid.border)[0]
+    if seq_type == 'row':
+        ranks, brackets, middle = shape_grid.rows, shape_grid.column_rows, shape_grid.middle_X
+    else:
+        ranks, brackets, middle = shape_grid.columns, shape_grid.row_columns, shape_grid.middle_Y
+
+    segments = range(len(curve._control_set))
+    values = extrusion.extrude(ranks[inner], brackets[inner], ranks[middle],
+                               [curve.control_points_y[s] for s in segments],
+                               [curve.control_points_limits[s] for s in segments])
+
+    reference = baseline_extrusion(grid_data(shape_grid), curve, seq_type, middle)
+    assert sorted(reference) == inner.tolist()
+    np.testing.assert_allclose(values, [reference[v] for v in inner], rtol=1e-12, atol=1e-12)
+    assert np.count_nonzero(values) > len(values) // 4
+
+
+def test_residual_rows_go_to_the_first_segments():
+    # 9 rows between the brackets and 3 segments: the 7 rows left between them split
+    # into 7/3 per segment, the residual row rounds the first segment up to 3
+    curve = ControlPoints(CURVES['three segments'], HEIGHT)
+    ranks = np.arange(10, 20)
+    brackets = np.tile((10, 19), (10, 1))
+    data = {rank: {'row': rank, 'column_rows': (10, 19)} for rank in ranks}
+
+    values = extrusion.extrude(ranks, brackets, 15, [curve.control_points_y[s] for s in range(3)],
+                               [curve.control_points_limits[s] for s in range(3)])
+    reference = baseline_extrusion(data, curve, 'row', 15)
+    np.testing.assert_allclose(values, [reference[rank] for rank in ranks], rtol=1e-12, atol=1e-12)
+
+    unique, inverse, sizes, ends = extrusion.segment_table([9], 3)
+    assert sizes.tolist() == [[3.0, 7 / 3, 7 / 3]]
+
+
+def test_border_brackets_give_zero():
+    values = extrusion.extrude([3, 4], [[3, 3], [2, 6]], 4, [[0, 1, 1, 0]], [[0, 1]])
+    assert values[0] == 0.0 and values[1] != 0.0
@@ -0,0 +1,145 @@
+""" grid.build_grid and core.make_grid against a port of the dict loops of the
+    old MatrixApproach.make_grid, on the synthetic socket meshes.
+"""
+
+import numpy as np
+import pytest
+
+from shapetool import angular, core, grid
+from socket_mesh import socket_mesh
+
+
+def baseline_grid(column_order, z, border, edges):
+    """ The row/column assignment of the old make_grid, with the bmesh access
+        replaced by arrays. Vertices without any boundary candidate raised
+        KeyError there, they get the (own, own) bracket of build_grid here.
+
+        Output: dict{vertex: {'column', 'row', 'column_rows', 'row_columns'}}, middle_X, middle_Y
+    """
+
+    shape_grid = {}
+    inner_columns, outer_columns = {}, {}
+    for indx, v in enumerate(column_order):
+        shape_grid[v] = {'column': indx}
+        if border[v]:
+            shape_grid[v]['border_vertex'] = True
+            outer_columns[indx] = v
+        else:
+            inner_columns[indx] = v
+
+    sorted_verts_z = sorted(range(len(z)), key=(lambda k: z[k]), reverse=True)
+    inner_rows, outer_rows = {}, {}
+    for indx, v in enumerate(sorted_verts_z):
+        shape_grid[v]['row'] = indx
+        if border[v]:
+            outer_rows[indx] = v
+        else:
+            inner_rows[indx] = v
+
+    for a, b in edges:
+        column_A, column_B = sorted((shape_grid[a]['column'], shape_grid[b]['column']))
+        row_A, row_B = sorted((shape_grid[a]['row'], shape_grid[b]['row']))
+        for column in range(column_A + 1, column_B):
+            if column in inner_columns:
+                vertex = shape_grid[inner_columns[column]]
+                vertex.setdefault('column_rows', []).append(shape_grid[outer_columns[column_A]]['row'])
+        for row in range(row_A + 1, row_B):
+            if row in inner_rows:
+                vertex = shape_grid[inner_rows[row]]
+                vertex.setdefault('row_columns', []).append(shape_grid[outer_rows[row_A]]['column'])
+
+    for vertex in shape_grid.values():
+        if 'border_vertex' in vertex:
+            continue
+        row_columns = vertex.get('row_columns', [vertex['column']])
+        column_rows = vertex.get('column_rows', [vertex['row']])
+        row_A, row_B = min(row_columns), max(row_columns)
+        column_A, column_B = min(column_rows), max(column_rows)
+        for column in row_columns:
+            if column > vertex['column'] and column <= row_B:
+                row_B = column
+            elif column < vertex['column'] and column >= row_A:
+                row_A = column
+        for row in column_rows:
+            if row > vertex['row'] and row <= column_B:
+                column_B = row
+            elif row < vertex['row'] and row >= column_A:
+                column_A = row
+        vertex['row_columns'] = (row_A, row_B)
+        vertex['column_rows'] = (column_A, column_B)
+
+    grid_mid = round(len(shape_grid) / 2)
+    return shape_grid, sorted_verts_z[grid_mid], column_order[grid_mid]
+
+
+def region_arrays(mesh, permutation=None):
+    """ Coordinates, border mask and shape loop edges of the shape region, in
+        region positions, optionally with the vertices shuffled.
+    """
+
+    index = np.nonzero(mesh.region)[0]
+    if permutation is not None:
+        index = index[permutation(len(index))]
+    local_index = np.full(len(mesh.co), -1)
+    local_index[index] = np.arange(len(index))
+    return mesh.co[index], mesh.border[index], local_index[mesh.loop_edges]
+
+
+def assert_same_grid(result, reference):
+    columns, rows, column_rows, row_columns, middle_X, middle_Y = result
+    shape_grid, reference_X, reference_Y = reference
+    for v, vertex in shape_grid.items():
+        assert columns[v] == vertex['column']
+        assert rows[v] == vertex['row']
+        if 'border_vertex' not in vertex:
+            assert tuple(column_rows[v]) == vertex['column_rows']
+            assert tuple(row_columns[v]) == vertex['row_columns']
+    assert (middle_X, middle_Y) == (reference_X, reference_Y)
+
+
+@pytest.mark.parametrize('quadrants', [1, 2, 3, 4])
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_build_grid_matches_baseline(quadrants, shuffle):
+    # The socket rings share their z (ties in the rows) and the levels share their angle
+    mesh = socket_mesh(600, quadrants)
+    permutation = np.random.RandomState(quadrants).permutation if shuffle else None
+    co, border, loop_edges = region_arrays(mesh, permutation)
+    column_order = angular.angular_order(co)
+
+    result = grid.build_grid(column_order, co[:, 2], border, loop_edges)
+    assert_same_grid(result, baseline_grid(column_order.tolist(), co[:, 2].tolist(), border, loop_edges.tolist()))
+
+
+def test_rows_keep_the_input_order_of_equal_z():
+    z = [1.0, 2.0, 1.0, 2.0, 1.0]
+    columns, rows = grid.build_grid(np.arange(5), z, np.ones(5, dtype=bool), np.empty((0, 2)))[:2]
+    assert rows.tolist() == [2, 0, 3, 1, 4]
+
+
+def test_boundary_brackets_closest_candidates():
+    # vertex 2 is covered by the edges (0, 4) and (1, 3), whose lower ends give the values 0 and 4
+    span_rank = np.arange(5)
+    value_rank = np.array([0, 4, 2, 3, 1])
+    interior = np.array([False, False, True, False, False])
+    brackets = grid.boundary_brackets(span_rank, value_rank, interior, np.array([[0, 4], [3, 1]]))
+    assert brackets.tolist() == [[0, 0], [4, 4], [0, 4], [3, 3], [1, 1]]
+
+
+def test_make_grid_matches_baseline():
+    mesh = socket_mesh(600, 2)
+    shape_grid = core.make_grid(mesh.co, mesh.region, mesh.border, mesh.edges)
+    co, border, loop_edges = region_arrays(mesh)
+    reference = baseline_grid(angular.angular_order(co).tolist(), co[:, 2].tolist(), border, loop_edges.tolist())
+
+    assert shape_grid.index.tolist() == np.nonzero(mesh.region)[0].tolist()
+    assert_same_grid((shape_grid.columns, shape_grid.rows, shape_grid.column_rows, shape_grid.row_columns,
+                      shape_grid.middle_X, shape_grid.middle_Y), reference)
+
+
+def test_empty_region():
+    columns, rows, column_rows, row_columns, middle_X, middle_Y = grid.build_grid([], [], [], np.empty((0, 2)))
+    assert (len(columns), len(rows), column_rows.shape, middle_X, middle_Y) == (0, 0, (0, 2), -1, -1)
+
+    mesh = socket_mesh(200)
+    shape_grid = core.make_grid(mesh.co, np.zeros(len(mesh.co), dtype=bool), mesh.border, mesh.edges)
+    assert (len(shape_grid), shape_grid.middle_X, shape_grid.middle_Y) == (0, -1, -1)
@@ -0,0 +1,21 @@
+""" Import time of the shape tool modules against the budget of
+    benchmarks/bench_import.py, each import in a fresh interpreter.
+"""
+
+import shutil
+
+import pytest
+
+import bench_import
+
+
+@pytest.mark.parametrize('module', bench_import.MODULES)
+def test_import_within_budget(module):
+    best = min(bench_import.python_import_time(module) for _ in range(bench_import.REPEAT))
+    assert best <= bench_import.BUDGET
+
+
+@pytest.mark.skipif(shutil.which('blender') is None, reason="needs a blender executable")
+def test_matrix_approach_import_within_budget():
+    # factory startup: the import must not look up the ImportedMesh or ShapeBezierCurve objects
+    assert bench_import.blender_import_time('blender') <= bench_import.BUDGET
@@ -0,0 +1,89 @@
+""" The buffered Logger: truncation, reopening and rotation of the log file. """
+
+import io
+
+import pytest
+
+from shapetool import log
+from shapetool.log import Logger
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    """ A fresh writer thread logging to a temporary file. """
+    path = tmp_path / 'logfile.txt'
+    monkeypatch.setattr(Logger, 'FILE_NAME', str(path))
+    monkeypatch.setattr(Logger, 'LEVEL', log.INFO)
+    monkeypatch.setattr(Logger, 'failed', 0)
+    monkeypatch.setattr(Logger, '_reported', False)
+    # the writer of an earlier test stays blocked on its own queue
+    monkeypatch.setattr(Logger, '_queue', None)
+    monkeypatch.setattr(Logger, '_thread', None)
+    yield path
+    Logger.flush()
+
+
+def test_first_open_truncates(log_file):
+    log_file.write_text("from an earlier run\n")
+    Logger.info("first")
+    Logger.debug("below the level")
+    assert Logger.flush()
+    assert log_file.read_text() == "INFO: first\n"
+
+
+def test_reopen_after_a_write_error_appends(log_file, monkeypatch):
+    class FailingFile(io.StringIO):
+        writes = 0
+
+        def write(self, text):
+            FailingFile.writes += 1
+            if FailingFile.writes == 2:
+                raise OSError("disk full")
+            with open(str(log_file), 'a') as f:
+                return f.write(text)
+
+        def tell(self):
+            return 0
+
+    monkeypatch.setattr(log, 'open', lambda name, mode: FailingFile(), raising=False)
+    for message in ("first", "lost", "third"):
+        Logger.info(message)
+        assert Logger.flush()
+
+    assert log_file.read_text() == "INFO: first\nINFO: third\n"
+    assert Logger.failed == 1
+
+
+def test_rotation_failure_keeps_appending(log_file, monkeypatch):
+    def fail(*args):
+        raise OSError("file in use")
+
+    monkeypatch.setattr(Logger, 'MAX_BYTES', 5)
+    monkeypatch.setattr(log.os, 'replace', fail)
+    for message in ("first", "second", "third"):
+        Logger.info(message)
+        assert Logger.flush()
+
+    assert log_file.read_text() == "INFO: first\nINFO: second\nINFO: third\n"
+    assert Logger.failed == 0
+
+
+def test_rotation(log_file, monkeypatch):
+    monkeypatch.setattr(Logger, 'MAX_BYTES', 5)
+    monkeypatch.setattr(Logger, 'BACKUPS', 2)
+    for message in ("first", "second", "third"):
+        Logger.info(message)
+        assert Logger.flush()
+
+    assert log_file.read_text() == ""
+    assert (log_file.parent / 'logfile.txt.1').read_text() == "INFO: third\n"
+    assert (log_file.parent / 'logfile.txt.2').read_text() == "INFO: second\n"
+    assert Logger.failed == 0
+
+
+def test_unwritable_file_counts_the_lost_messages(log_file, monkeypatch):
+    monkeypatch.setattr(Logger, 'FILE_NAME', str(log_file.parent / 'missing' / 'logfile.txt'))
+    Logger.info("lost")
+    Logger.info("lost too")
+    assert Logger.flush()
+    assert Logger.failed == 2
@@ -0,0 +1,68 @@
+""" Loop repair kernels: vertex degrees, the k-d tree candidates and the gap pairing. """
+
+import numpy as np
+import pytest
+
+from shapetool import loops
+
+
+def test_vertex_degrees_and_histogram():
+    # a loop 0-1-2-3 with a gap between 3 and 0, and a shortcut 1-3
+    edges = [(0, 1), (1, 2), (2, 3), (1, 3)]
+    degrees = loops.vertex_degrees(edges, 5)
+    assert degrees.tolist() == [1, 3, 2, 2, 0]
+    assert loops.degree_histogram(degrees) == {0: 1, 1: 1, 2: 2, 3: 1}
+    assert loops.degree_histogram(degrees[:4]) == {1: 1, 2: 2, 3: 1}
+    assert loops.vertex_degrees(np.empty((0, 2)), 3).tolist() == [0, 0, 0]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_kdtree_matches_brute_force(seed):
+    random = np.random.RandomState(seed)
+    co = np.round(random.uniform(-1, 1, (300, 3)), 1)  # coincident points and ties in distance
+    tree = loops.KDTree(co, leaf_size=4)
+    for point in co[:50].tolist() + random.uniform(-1.5, 1.5, (20, 3)).tolist():
+        distances, indices = tree.find_n(point, 7)
+        squared = np.einsum('ij,ij->i', co - point, co - point)
+        expected = np.lexsort((np.arange(len(co)), squared))[:7]
+        assert indices.tolist() == expected.tolist()
+        np.testing.assert_allclose(distances, np.sqrt(squared[expected]))
+
+
+def test_kdtree_small_and_empty():
+    assert len(loops.KDTree(np.empty((0, 3))).find_n((0, 0, 0), 3)[1]) == 0
+    distances, indices = loops.KDTree([(0, 0, 0), (2, 0, 0)]).find_n((1.5, 0, 0), 5)
+    assert indices.tolist() == [1, 0] and distances.tolist() == [0.5, 1.5]
+
+
+def test_gap_candidates_skip_joined_pairs():
+    co = [(0, 0, 0), (1, 0, 0), (5, 0, 0), (5.5, 0, 0)]
+    distances, first, second = loops.gap_candidates(co, joined=[(2, 3)], neighbours=1)
+    candidates = set(zip(first.tolist(), second.tolist()))
+    assert (0, 1) in candidates and (1, 0) in candidates
+    assert (2, 3) not in candidates and (3, 2) not in candidates
+    assert loops.gap_candidates([(0, 0, 0)])[0].tolist() == []
+
+
+def test_match_pairs_uses_every_vertex_once():
+    # 1 is the nearest vertex of both 0 and 2, it can only close one gap
+    co = [(0, 0, 0), (1, 0, 0), (2.1, 0, 0), (3.5, 0, 0)]
+    pairs, unmatched = loops.match_pairs(4, *loops.gap_candidates(co))
+    assert pairs == [(0, 1), (2, 3)] and unmatched == []
+    used = [v for pair in pairs for v in pair]
+    assert len(used) == len(set(used))
+
+
+def test_match_pairs_never_pairs_joined_vertices():
+    # 0-1 and 2-3 are closest but already joined: 1-2 closes first, then 0-3
+    co = [(0, 0, 0), (0.1, 0, 0), (1, 0, 0), (1.1, 0, 0)]
+    pairs, unmatched = loops.match_pairs(4, *loops.gap_candidates(co, joined=[(0, 1), (3, 2)]))
+    assert sorted(tuple(sorted(pair)) for pair in pairs) == [(0, 3), (1, 2)]
+    assert unmatched == []
+
+
+def test_match_pairs_leaves_an_odd_vertex_unmatched():
+    co = [(0, 0, 0), (1, 0, 0), (10, 0, 0), (11, 0, 0), (30, 0, 0)]
+    pairs, unmatched = loops.match_pairs(5, *loops.gap_candidates(co))
+    assert pairs == [(0, 1), (2, 3)] and unmatched == [4]
+    assert loops.match_pairs(3, [1.0, 1.0], [0, 1], [0, 1]) == ([], [0, 1, 2])
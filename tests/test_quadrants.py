@@ -0,0 +1,110 @@
+""" quadrants.QuadrantMap and core.create_shape_vertex_map against ports of
+    the generator passes of get_shape_limits.py and of the old
+    MatrixApproach.create_shape_vertex_map.
+"""
+
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from shapetool import angular, core, quadrants
+from socket_mesh import socket_mesh
+
+
+Co = namedtuple('Co', 'x y z')
+Vert = namedtuple('Vert', 'index co')
+
+FILTERS = {'Q1': lambda v: v.co.x > 0 and v.co.y > 0,
+           'Q2': lambda v: v.co.x < 0 and v.co.y > 0,
+           'Q3': lambda v: v.co.x < 0 and v.co.y < 0,
+           'Q4': lambda v: v.co.x > 0 and v.co.y < 0}
+
+
+def as_verts(co):
+    return [Vert(i, Co(*c)) for i, c in enumerate(np.asarray(co).tolist())]
+
+
+def baseline_vertex_map(shape_min, shape_max, verts):
+    """ The old create_shape_vertex_map. """
+    initial_vert_map = {}
+    for quadrant, inside in sorted(FILTERS.items()):
+        verts_x = {v.index: v.co.x for v in verts if inside(v)}
+        initial_vert_map[quadrant] = sorted(verts_x, key=(lambda k: verts_x[k]), reverse=quadrant in ('Q1', 'Q2'))
+
+    shape_coverage = [key for key in initial_vert_map.keys() if len(initial_vert_map[key])]
+
+    sorted_initial_vert_map = []
+    visited = []
+    for limit in [shape_min, shape_max]:
+        for quadrant in shape_coverage:
+            if limit.index in initial_vert_map[quadrant]:
+                sorted_initial_vert_map.append(initial_vert_map[quadrant])
+                visited.append(quadrant)
+
+    for quadrant in shape_coverage:
+        if quadrant not in visited:
+            sorted_initial_vert_map.insert(1, initial_vert_map[quadrant])
+
+    return sorted_initial_vert_map
+
+
+def tied_points(seed, n=400):
+    """ Points on a coarse lattice: ties in x and y, and points on both axes. """
+    return np.random.RandomState(seed).randint(-5, 6, size=(n, 3)) * 0.5
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_extremes_match_min_max(seed):
+    verts = as_verts(tied_points(seed))
+    quadrant_map = quadrants.QuadrantMap([v.co for v in verts])
+
+    for axis in ('x', 'y'):
+        key = lambda v: getattr(v.co, axis)
+        assert quadrant_map.argmin(axis) == min(verts, key=key).index
+        assert quadrant_map.argmax(axis) == max(verts, key=key).index
+        for count in (1, 2, 3):
+            for names in combinations(sorted(FILTERS), count):
+                inside = [v for v in verts if any(FILTERS[q](v) for q in names)]
+                assert quadrant_map.argmin(axis, names) == min(inside, key=key).index
+                assert quadrant_map.argmax(axis, names) == max(inside, key=key).index
+
+
+def test_empty_quadrants():
+    quadrant_map = quadrants.QuadrantMap([(1.0, 1.0, 0.0), (0.0, -1.0, 0.0)])
+    assert quadrant_map.coverage() == ['Q1']
+    assert quadrant_map.argmin('x', ['Q2', 'Q3']) == -1
+    assert quadrant_map.indices('Q4').tolist() == []
+    assert quadrant_map.argmin('y') == 1
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_indices_match_sorted(seed):
+    verts = as_verts(tied_points(seed))
+    quadrant_map = quadrants.QuadrantMap([v.co for v in verts])
+    for quadrant, inside in FILTERS.items():
+        for descending in (False, True):
+            expected = sorted((v for v in verts if inside(v)), key=lambda v: v.co.x, reverse=descending)
+            assert quadrant_map.indices(quadrant, descending).tolist() == [v.index for v in expected]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_vertex_map_with_ties_matches_baseline(seed):
+    co = tied_points(seed)
+    verts = as_verts(co)
+    for shape_min, shape_max in [(0, 1), (2, 3), (5, 7)]:
+        assert core.create_shape_vertex_map(shape_min, shape_max, co) == \
+            baseline_vertex_map(verts[shape_min], verts[shape_max], verts)
+
+
+@pytest.mark.parametrize('quadrants_covered', [1, 2, 3])
+def test_vertex_map_of_socket_shapes_matches_baseline(quadrants_covered):
+    mesh = socket_mesh(2000, quadrants_covered)
+    co = mesh.co[mesh.region]
+    shape_min, shape_max = angular.angular_order(co)[[0, -1]]
+    verts = as_verts(co)
+
+    vertex_map = core.create_shape_vertex_map(shape_min, shape_max, co)
+    assert vertex_map == baseline_vertex_map(verts[shape_min], verts[shape_max], verts)
+    assert set(sum(vertex_map, [])) == set(np.nonzero(quadrants.quadrant_codes(co))[0].tolist())